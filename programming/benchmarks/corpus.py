@@ -0,0 +1,149 @@
+"""
+Synthetic chat replay corpus for the benchmarks
+
+Chats mimic what ChatDownloader returns for a Twitch clip: author id and
+badges, message, message_id, time_text and time_in_seconds. The message
+mix, emoji density and badge distribution are configurable so each hot
+path can be exercised with realistic and with adversarial inputs.
+"""
+
+import json
+import os
+import random
+import pandas as pd
+from typing import NamedTuple
+
+EMOJIS = ["🔥", "😂", "👍", "👍🏽", "❤️", "🎉", "😭", "🙏", "💀", "🇹🇼", "👀", "✨"]
+WORDS = ["pog", "lol", "gg", "nice", "what", "no way", "clip it", "W", "L", "omg"]
+
+# message kind -> share of messages
+DEFAULT_MESSAGE_MIX = {"plain": 0.9, "cheer": 0.04, "subscribed": 0.04, "gifting": 0.02}
+
+# badge titles -> share of authors wearing that combination
+DEFAULT_BADGE_DISTRIBUTION = {
+    (): 0.45,
+    ("1-Month Subscriber",): 0.15,
+    ("6-Month Subscriber", "cheer 1000"): 0.1,
+    ("2-Year Subscriber", "5 Gift Subs"): 0.06,
+    ("VIP", "3-Month Subscriber"): 0.04,
+    ("Prime Gaming",): 0.1,
+    ("Turbo",): 0.03,
+    ("Gifter Leader 1", "100 Gift Subs"): 0.02,
+    ("Bits Leader 2", "cheer 5000"): 0.02,
+    ("Moderator", "1-Year Subscriber"): 0.03,
+}
+
+
+class CorpusConfig(NamedTuple):
+    messages_per_clip: int = 20_000
+    clips_per_user: int = 2
+    users: int = 2
+    authors: int = 2_000
+    emoji_density: float = 0.3  # chance that a message carries emojis
+    message_mix: dict = DEFAULT_MESSAGE_MIX
+    badge_distribution: dict = DEFAULT_BADGE_DISTRIBUTION
+    clip_seconds: int = 60
+    seed: int = 0
+
+    @property
+    def total_messages(self) -> int:
+        return self.messages_per_clip * self.clips_per_user * self.users
+
+
+def _message(rng: random.Random, kind: str, emoji_density: float) -> str:
+    if kind == "cheer":
+        text = f"Cheer{rng.choice([1, 100, 500, 1000])} {rng.choice(WORDS)}"
+    elif kind == "subscribed":
+        text = (
+            f"subscribed at Tier {rng.randint(1, 3)}. They've subscribed for "
+            f"{rng.randint(2, 48)} months!"
+        )
+    elif kind == "gifting":
+        text = (
+            f"is gifting {rng.choice([1, 5, 10, 50])} Tier {rng.randint(1, 3)} "
+            f"Subs to streamer's community!"
+        )
+    else:
+        text = " ".join(rng.choices(WORDS, k=rng.randint(1, 6)))
+    if rng.random() < emoji_density:
+        text += " " + "".join(rng.choices(EMOJIS, k=rng.randint(1, 4)))
+    return text
+
+
+def generate_chat_replay(config: CorpusConfig, clip_seed: int = 0) -> list:
+    """One clip's chat replay as a list of chat items"""
+    rng = random.Random(config.seed * 1_000_003 + clip_seed)
+    kinds = rng.choices(
+        list(config.message_mix),
+        weights=list(config.message_mix.values()),
+        k=config.messages_per_clip,
+    )
+    badge_sets = list(config.badge_distribution)
+    author_badges = rng.choices(
+        badge_sets,
+        weights=list(config.badge_distribution.values()),
+        k=config.authors,
+    )
+    chats = []
+    for i, kind in enumerate(kinds):
+        author = rng.randrange(config.authors)
+        seconds = config.clip_seconds * i / config.messages_per_clip
+        chats.append(
+            {
+                "author": {
+                    "id": str(100_000 + author),
+                    "badges": [{"title": title} for title in author_badges[author]],
+                },
+                "message": _message(rng, kind, config.emoji_density),
+                "message_id": f"{clip_seed:04d}-{i:08d}",
+                "time_text": f"{int(seconds) // 60}:{int(seconds) % 60:02d}",
+                "time_in_seconds": round(seconds, 3),
+            }
+        )
+    return chats
+
+
+def write_corpus(data_root: str, config: CorpusConfig) -> dict:
+    """
+    Write chat replays and clip summaries under data_root
+
+    Layout matches the pipeline: '<data_root>/comments/<user_id>/<clip_id>.json'
+    and '<data_root>/clips/<user_id>.csv'.
+
+    Returns:
+        dict: user_id -> list of chat file paths
+    """
+    files = {}
+    for user in range(config.users):
+        user_id = str(10_000 + user)
+        chat_dir = os.path.join(data_root, "comments", user_id)
+        os.makedirs(chat_dir, exist_ok=True)
+        clip_rows = []
+        for clip in range(config.clips_per_user):
+            clip_seed = user * config.clips_per_user + clip
+            clip_id = f"BenchClip{clip_seed:04d}"
+            file_path = os.path.join(chat_dir, f"{clip_id}.json")
+            with open(file_path, "w", encoding="utf-8") as chat_file:
+                json.dump(generate_chat_replay(config, clip_seed), chat_file)
+            files.setdefault(user_id, []).append(file_path)
+            clip_rows.append(
+                {
+                    "clip_id": clip_id,
+                    "video_id": str(2_000_000 + clip_seed) if clip % 5 else None,
+                    "created_at": f"2025-05-{1 + clip % 28:02d}T00:00:00Z",
+                    "duration": float(config.clip_seconds),
+                    "view_count": clip_seed * 7,
+                }
+            )
+        os.makedirs(os.path.join(data_root, "clips"), exist_ok=True)
+        pd.DataFrame(clip_rows).to_csv(
+            os.path.join(data_root, "clips", f"{user_id}.csv"), index=False
+        )
+    return files
+
+
+def write_comment_report_inputs(chat_dfs: dict, output_dir: str):
+    """Write enriched chats as the '<user_id>.csv' files read by create_comment_report"""
+    os.makedirs(output_dir, exist_ok=True)
+    for user_id, chat_df in chat_dfs.items():
+        chat_df.to_csv(os.path.join(output_dir, f"{user_id}.csv"))
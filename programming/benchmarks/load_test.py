@@ -0,0 +1,300 @@
+"""
+Offline end-to-end load test: Helix fetch -> chat download -> processing
+
+Run from programming/:
+    python -m benchmarks.load_test --users 20 --clips-per-user 500
+    python -m benchmarks.load_test --rate-limit 120 --throttle-rate 0.02 --error-rate 0.02
+
+The pipeline of twitch.py's __main__ runs in a temporary directory
+against MockHelixServer and FakeChatDownloader, stage by stage or with
+--streaming. Video downloads are left out. The run fails (exit status 1)
+when a user's clips come back incomplete or the client ran the server's
+rate-limit bucket dry.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import NamedTuple
+
+from benchmarks.corpus import CorpusConfig
+from benchmarks.mock_twitch import FakeChatDownloader, MockHelixServer, MockTwitchConfig
+
+
+class StageResult(NamedTuple):
+    name: str
+    seconds: float
+    items: int
+    unit: str
+
+    @property
+    def per_second(self) -> float:
+        return round(self.items / self.seconds, 1) if self.seconds else 0.0
+
+
+def count_successes(results: list) -> int:
+    return sum(1 for result in results if result.get("status") == "success")
+
+
+def run_staged(twitch, helix, chat_download, user_ids, max_workers, output_format):
+    """The stages of twitch.py's "staged" __main__, each timed on its own"""
+    stages = []
+    start = time.perf_counter()
+    clip_summaries = {
+        user_id: helix.summary_user_clips_to_csv(user_id) for user_id in user_ids
+    }
+    stages.append(
+        StageResult(
+            "clips",
+            time.perf_counter() - start,
+            sum(len(clips) for clips in clip_summaries.values()),
+            "clips",
+        )
+    )
+
+    start = time.perf_counter()
+    for user_id, clip_summary_df in clip_summaries.items():
+        if clip_summary_df.empty:
+            continue
+        chat_download.download_and_save_chats_from_clips(
+            user_id,
+            f"{twitch.CHAT_DIRECTORY}/{user_id}",
+            twitch.get_replayable_clip_urls(clip_summary_df),
+        )
+    stages.append(
+        StageResult(
+            "chats",
+            time.perf_counter() - start,
+            sum(chat_download.downloader.calls.values()),
+            "clips",
+        )
+    )
+
+    start = time.perf_counter()
+    results = twitch.process_all_clips_parallel(
+        twitch.get_items_in_dir(twitch.CHAT_DIRECTORY),
+        max_workers=max_workers,
+        output_format=output_format,
+    )
+    processed = [result for user in results for result in user["processed_files"]]
+    stages.append(
+        StageResult(
+            "processing",
+            time.perf_counter() - start,
+            count_successes(processed),
+            "clips",
+        )
+    )
+    return stages
+
+
+def run_load_test(
+    config: MockTwitchConfig,
+    chat_downloader: FakeChatDownloader,
+    client_rate_limit: int = None,
+    max_workers: int = None,
+    output_format: str = "parquet",
+    streaming: bool = False,
+) -> dict:
+    """
+    Run the pipeline in the current directory against a mock Helix server
+
+    Args:
+        client_rate_limit (int, optional): requests per minute the client's
+            RateLimiter allows, defaults to the server's limit
+        output_format (str): "parquet" or "csv", see process_chat_file
+        streaming (bool): run twitch.run_streaming_pipeline instead of the
+            stages one after another
+
+    Returns:
+        dict: stage timings, server request counts and verification errors
+    """
+    # Imported here so their relative DATA_ROOT paths resolve in the work dir
+    import twitch
+    from utils.helix import HelixClient, RateLimiter
+
+    for directory in [twitch.CLIP_DIRECTORY, twitch.CHAT_DIRECTORY]:
+        os.makedirs(directory, exist_ok=True)
+    with MockHelixServer(config) as server:
+        client = HelixClient(
+            {"Client-Id": twitch.CLIENT_ID, "Authorization": "Bearer mock-token"},
+            base_url=server.base_url,
+            rate_limiter=RateLimiter(client_rate_limit or config.rate_limit),
+            metrics=twitch.pipeline_metrics,
+        )
+        helix = twitch.Twitch(
+            started_at=config.started_at, ended_at=config.ended_at, client=client
+        )
+        chat_download = twitch.ChatDownload()
+        chat_download.downloader = chat_downloader
+        stages = []
+
+        start = time.perf_counter()
+        names = [config.login(user) for user in range(config.users)]
+        user_info_df = helix.get_users_info(names)
+        stages.append(
+            StageResult(
+                "users", time.perf_counter() - start, len(user_info_df), "users"
+            )
+        )
+
+        user_ids = list(user_info_df["twitch_user_id"])
+        if streaming:
+            start = time.perf_counter()
+            results = twitch.run_streaming_pipeline(
+                user_ids,
+                helix,
+                chat_download,
+                output_format=output_format,
+                process_workers=max_workers,
+                download_videos=False,
+            )
+            stages.append(
+                StageResult(
+                    "pipeline",
+                    time.perf_counter() - start,
+                    count_successes(results["processed_files"]),
+                    "clips",
+                )
+            )
+        else:
+            stages.extend(
+                run_staged(
+                    twitch, helix, chat_download, user_ids, max_workers, output_format
+                )
+            )
+
+        errors = []
+        fetched_clips = 0
+        for user_id in user_ids:
+            expected = {clip["id"] for clip in server.expected_clips(user_id)}
+            fetched = set(
+                twitch.read_clip_ids(f"{twitch.CLIP_DIRECTORY}/{user_id}.csv")
+            )
+            fetched_clips += len(fetched)
+            if fetched != expected:
+                errors.append(
+                    f"user {user_id}: fetched {len(fetched)} of {len(expected)} clips"
+                )
+        server_stats = server.stats()
+
+    if server_stats["by_status"].get("429"):
+        errors.append(
+            f"client exceeded the rate limit {server_stats['by_status']['429']} times"
+        )
+    total_seconds = sum(stage.seconds for stage in stages)
+    return {
+        "stages": [
+            {**stage._asdict(), "per_second": stage.per_second} for stage in stages
+        ],
+        "total_seconds": round(total_seconds, 3),
+        "clips_per_second": round(fetched_clips / total_seconds, 1),
+        "server": server_stats,
+        "chat_downloader": dict(chat_downloader.calls),
+        "metrics": twitch.pipeline_metrics.summary(),
+        "errors": errors,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    defaults = MockTwitchConfig()
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--clips-per-user", type=int, default=defaults.clips_per_user)
+    parser.add_argument("--rate-limit", type=int, default=defaults.rate_limit)
+    parser.add_argument(
+        "--client-rate-limit",
+        type=int,
+        help="requests per minute of the client's RateLimiter, defaults to --rate-limit",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        nargs=2,
+        default=defaults.latency,
+        metavar=("MIN", "MAX"),
+    )
+    parser.add_argument("--throttle-rate", type=float, default=defaults.throttle_rate)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--messages-per-clip", type=int, default=500)
+    parser.add_argument(
+        "--chat-latency",
+        type=float,
+        nargs=2,
+        default=(0.05, 0.2),
+        metavar=("MIN", "MAX"),
+    )
+    parser.add_argument("--no-replay-rate", type=float, default=0.05)
+    parser.add_argument("--max-workers", type=int)
+    parser.add_argument(
+        "--output-format", choices=["parquet", "csv"], default="parquet"
+    )
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument(
+        "--streaming", action="store_true", help="overlap the stages, see PIPELINE_MODE"
+    )
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    config = defaults._replace(
+        users=args.users,
+        clips_per_user=args.clips_per_user,
+        rate_limit=args.rate_limit,
+        latency=tuple(args.latency),
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    chat_downloader = FakeChatDownloader(
+        CorpusConfig(messages_per_clip=args.messages_per_clip, seed=args.seed),
+        latency=tuple(args.chat_latency),
+        no_replay_rate=args.no_replay_rate,
+    )
+    output_path = args.output and os.path.abspath(args.output)
+
+    cwd = os.getcwd()
+    sys.path.insert(0, cwd)
+    with tempfile.TemporaryDirectory(prefix="twitch-load-") as work_dir:
+        os.chdir(work_dir)
+        try:
+            report = run_load_test(
+                config,
+                chat_downloader,
+                client_rate_limit=args.client_rate_limit,
+                max_workers=args.max_workers,
+                output_format=args.output_format,
+                streaming=args.streaming,
+            )
+        finally:
+            os.chdir(cwd)
+
+    for stage in report["stages"]:
+        print(
+            f"{stage['name']:<12}{stage['seconds']:>9.2f}s"
+            f"{stage['items']:>9} {stage['unit']:<6}{stage['per_second']:>10.1f}/s"
+        )
+    server = report["server"]
+    print(
+        f"{report['clips_per_second']} clips/s end to end, "
+        f"{server['requests']} Helix requests at {server['requests_per_second']}/s"
+    )
+    print(f"responses: {server['by_status']}")
+    for stage, timing in report["metrics"].items():
+        print(
+            f"  {stage:<34}{timing['count']:>7} runs{timing['seconds']:>10.2f}s"
+            f"  p95 {timing.get('p95', 0):.3f}s  {timing['counters'] or ''}"
+            f"{timing['errors'] or ''}"
+        )
+    for error in report["errors"]:
+        print(f"FAILED {error}")
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
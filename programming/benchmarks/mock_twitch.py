@@ -0,0 +1,342 @@
+"""
+Local stand-ins for the Twitch services the pipeline talks to
+
+MockHelixServer serves /helix/users, /helix/channels/followers and
+paginated /helix/clips from generated data, with Helix's Ratelimit-*
+headers, its own token bucket answering 429 when it runs dry, injected
+latency and injected 429/503 faults. FakeChatDownloader replaces
+ChatDownloader and streams synthetic chat replays from benchmarks.corpus.
+"""
+
+import base64
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+from urllib.parse import parse_qs, urlsplit
+
+from chat_downloader.errors import NoChatReplay
+
+from benchmarks.corpus import CorpusConfig, generate_chat_replay
+
+GAME_ID = "21779"  # League of Legends, the game twitch.py keeps
+OTHER_GAME_ID = "509658"
+MAX_PAGE_SIZE = 100
+
+
+class MockTwitchConfig(NamedTuple):
+    users: int = 10
+    clips_per_user: int = 200
+    started_at: str = "2025-05-01T00:00:00Z"
+    ended_at: str = "2025-07-01T00:00:00Z"
+    other_game_share: float = 0.1  # clips filtered out by game_id
+    without_vod_share: float = 0.2  # clips with an empty video_id
+    rate_limit: int = 800  # requests per minute, as for an app access token
+    latency: tuple = (0.01, 0.05)  # seconds added to every response
+    throttle_rate: float = 0.0  # share of requests answered with a forced 429
+    error_rate: float = 0.0  # share of requests answered with a 503
+    seed: int = 0
+
+    def login(self, user: int) -> str:
+        return f"benchstreamer{user}"
+
+    def user_id(self, user: int) -> str:
+        return str(10_000 + user)
+
+
+def _parse_time(timestamp: str) -> datetime:
+    return datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+
+
+def _format_time(timestamp: datetime) -> str:
+    return timestamp.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def generate_clips(config: MockTwitchConfig, user: int) -> list:
+    """A user's clips as Helix returns them, most viewed first"""
+    rng = random.Random(config.seed * 1_000_003 + user)
+    started = _parse_time(config.started_at)
+    span = (_parse_time(config.ended_at) - started).total_seconds()
+    clips = []
+    for clip in range(config.clips_per_user):
+        clip_id = f"MockClip{user:04d}x{clip:06d}"
+        has_vod = rng.random() >= config.without_vod_share
+        clips.append(
+            {
+                "id": clip_id,
+                "url": f"https://clips.twitch.tv/{clip_id}",
+                "broadcaster_id": config.user_id(user),
+                "broadcaster_name": config.login(user),
+                "creator_id": str(rng.randrange(1_000_000)),
+                "video_id": str(3_000_000 + clip) if has_vod else "",
+                "game_id": (
+                    OTHER_GAME_ID if rng.random() < config.other_game_share else GAME_ID
+                ),
+                "language": "zh",
+                "title": f"clip {clip}",
+                "view_count": rng.randrange(10_000),
+                "created_at": _format_time(
+                    started + timedelta(seconds=int(rng.random() * span))
+                ),
+                "duration": round(rng.uniform(5, 60), 1),
+                "vod_offset": rng.randrange(36_000) if has_vod else None,
+            }
+        )
+    clips.sort(key=lambda clip: clip["view_count"], reverse=True)
+    return clips
+
+
+def _encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"o": offset}).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> int:
+    return json.loads(base64.urlsafe_b64decode(cursor.encode()))["o"]
+
+
+class _TokenBucket:
+    """The server side of Helix's rate limit"""
+
+    def __init__(self, limit: int, period: float = 60.0):
+        self.limit = limit
+        self.rate = limit / period
+        self.tokens = float(limit)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> tuple:
+        """Spend a token if there is one; returns (allowed, remaining, reset epoch)"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.limit, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            allowed = self.tokens >= 1
+            if allowed:
+                self.tokens -= 1
+            missing = max(0.0, 1 - self.tokens)
+            reset = math.ceil(time.time() + missing / self.rate)
+            return allowed, int(self.tokens), reset
+
+
+class MockHelixServer:
+    """
+    Threaded local Helix server, usable as a context manager
+
+    Point a HelixClient at `base_url`. Every request is counted by path
+    and status in `stats()`, which separates 429s caused by the client
+    outrunning the bucket from the ones injected by throttle_rate.
+    """
+
+    def __init__(self, config: MockTwitchConfig = MockTwitchConfig(), port: int = 0):
+        self.config = config
+        self.users = {
+            config.login(user): {
+                "id": config.user_id(user),
+                "login": config.login(user),
+                "display_name": config.login(user),
+                "type": "",
+                "broadcaster_type": "partner",
+                "created_at": "2015-01-01T00:00:00Z",
+            }
+            for user in range(config.users)
+        }
+        self.clips = {
+            config.user_id(user): generate_clips(config, user)
+            for user in range(config.users)
+        }
+        self.bucket = _TokenBucket(config.rate_limit)
+        self.requests = Counter()
+        self.started = None
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/helix"
+
+    def start(self):
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def expected_clips(self, user_id: str, game_id: str = GAME_ID) -> list:
+        """Clips of a user the pipeline should end up with"""
+        return [clip for clip in self.clips[user_id] if clip["game_id"] == game_id]
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        with self._lock:
+            requests = dict(self.requests)
+        total = sum(requests.values())
+        by_status = Counter()
+        for (_, status), count in requests.items():
+            by_status[status] += count
+        return {
+            "requests": total,
+            "requests_per_second": round(total / elapsed, 1) if elapsed else 0.0,
+            "by_status": dict(by_status),
+            "by_path": {
+                f"{path} {status}": count for (path, status), count in requests.items()
+            },
+        }
+
+    def _record(self, path: str, status: str):
+        with self._lock:
+            self.requests[(path, status)] += 1
+
+    def _fault(self) -> str:
+        with self._lock:
+            draw = self._rng.random()
+        if draw < self.config.throttle_rate:
+            return "429"
+        if draw < self.config.throttle_rate + self.config.error_rate:
+            return "503"
+        return ""
+
+    def _users(self, query: dict) -> dict:
+        logins = query.get("login", [])
+        ids = set(query.get("id", []))
+        data = [self.users[login] for login in logins if login in self.users]
+        data += [user for user in self.users.values() if user["id"] in ids]
+        return {"data": data}
+
+    def _followers(self, query: dict) -> dict:
+        user_id = query.get("broadcaster_id", [""])[0]
+        return {"total": zlib.crc32(user_id.encode()) % 500_000, "data": []}
+
+    def _clips(self, query: dict) -> dict:
+        user_id = query.get("broadcaster_id", [""])[0]
+        started_at = query.get("started_at", [""])[0]
+        ended_at = query.get("ended_at", ["9999"])[0]
+        first = min(int(query.get("first", ["20"])[0]), MAX_PAGE_SIZE)
+        offset = _decode_cursor(query["after"][0]) if "after" in query else 0
+        clips = [
+            clip
+            for clip in self.clips.get(user_id, [])
+            if started_at <= clip["created_at"] < ended_at
+        ]
+        page = clips[offset : offset + first]
+        next_offset = offset + len(page)
+        return {
+            "data": page,
+            "pagination": (
+                {"cursor": _encode_cursor(next_offset)}
+                if next_offset < len(clips)
+                else {}
+            ),
+        }
+
+    def _handler(self):
+        server = self
+        routes = {
+            "/helix/users": self._users,
+            "/helix/channels/followers": self._followers,
+            "/helix/clips": self._clips,
+        }
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: dict, headers: dict):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, str(value))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                time.sleep(random.uniform(*server.config.latency))
+                allowed, remaining, reset = server.bucket.take()
+                headers = {
+                    "Ratelimit-Limit": server.config.rate_limit,
+                    "Ratelimit-Remaining": remaining,
+                    "Ratelimit-Reset": reset,
+                }
+                route = routes.get(url.path)
+                if route is None:
+                    server._record(url.path, "404")
+                    return self._send(404, {"error": "Not Found"}, headers)
+                if not allowed:
+                    server._record(url.path, "429")
+                    return self._send(429, {"error": "Too Many Requests"}, headers)
+                fault = server._fault()
+                if fault == "429":
+                    server._record(url.path, "429 injected")
+                    headers.update(
+                        {
+                            "Ratelimit-Remaining": 0,
+                            "Ratelimit-Reset": int(time.time()) + 1,
+                        }
+                    )
+                    return self._send(429, {"error": "Too Many Requests"}, headers)
+                if fault == "503":
+                    server._record(url.path, "503 injected")
+                    return self._send(503, {"error": "Service Unavailable"}, headers)
+                server._record(url.path, "200")
+                self._send(200, route(parse_qs(url.query)), headers)
+
+        return Handler
+
+
+class FakeChatDownloader:
+    """
+    Drop-in for ChatDownloader.get_chat that serves synthetic replays
+
+    A no_replay_rate share of clips, picked by clip id, raise NoChatReplay
+    like the real downloader. Chats are yielded one by one after the
+    injected latency, so write_chat_file streams them as usual.
+    """
+
+    def __init__(
+        self,
+        corpus: CorpusConfig = CorpusConfig(messages_per_clip=500),
+        latency: tuple = (0.05, 0.2),
+        no_replay_rate: float = 0.05,
+    ):
+        self.corpus = corpus
+        self.latency = latency
+        self.no_replay_rate = no_replay_rate
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def get_chat(self, url: str, **kwargs):
+        clip_id = url.rstrip("/").rsplit("/", 1)[-1]
+        clip_seed = zlib.crc32(clip_id.encode())
+        time.sleep(random.uniform(*self.latency))
+        if random.Random(clip_seed).random() < self.no_replay_rate:
+            with self._lock:
+                self.calls["no_replay"] += 1
+            raise NoChatReplay(f"Clip {clip_id} has no chat replay")
+        with self._lock:
+            self.calls["chats"] += 1
+        return iter(generate_chat_replay(self.corpus, clip_seed))
@@ -0,0 +1,322 @@
+"""
+Time the chat pipeline's hot paths on a synthetic corpus
+
+Run from programming/:
+    python -m benchmarks.run_benchmarks --messages-per-clip 20000 --save-baseline
+    python -m benchmarks.run_benchmarks --compare
+
+Every benchmark reports the best wall time of --repeat runs, messages per
+second and the peak Python memory of one extra run under tracemalloc.
+--compare exits with status 1 when a benchmark got slower than the saved
+baseline by more than --tolerance. When pyarrow is installed, the comment
+report is also built from a Parquet copy of the corpus and must match the
+CSV one; a mismatch exits with status 1 too.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import pandas as pd
+from datetime import datetime
+from typing import Callable, NamedTuple
+
+from benchmarks.corpus import CorpusConfig, write_comment_report_inputs, write_corpus
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+REGRESSION_TOLERANCE = 0.10
+
+
+class BenchmarkResult(NamedTuple):
+    name: str
+    messages: int
+    seconds: float
+    messages_per_second: float
+    peak_memory_mb: float
+
+
+def measure(
+    name: str, function: Callable, setup: Callable, messages: int, repeat: int
+) -> BenchmarkResult:
+    """
+    Best-of-repeat timing of function(*setup()), then one traced run
+
+    setup builds fresh inputs outside the timed region, since the chat
+    stages add columns to the frames they are given.
+    """
+    times = []
+    for _ in range(repeat):
+        args = setup()
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    args = setup()
+    tracemalloc.start()
+    try:
+        function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    seconds = min(times)
+    return BenchmarkResult(
+        name=name,
+        messages=messages,
+        seconds=round(seconds, 4),
+        messages_per_second=round(messages / seconds) if seconds else 0,
+        peak_memory_mb=round(peak / 2**20, 2),
+    )
+
+
+def compare_comment_reports(report_dir: str, dataset_dir: str) -> list:
+    """
+    Users whose Parquet comment report row differs from the CSV one
+
+    Both reports are built from the same chats, so any difference is a bug
+    in one of the two paths.
+
+    Returns:
+        list: (user_id, CSV row, Parquet row) of each mismatch, rows as dicts
+    """
+    import make_reports
+
+    csv_report = make_reports.create_comment_report(report_dir, cache=None)
+    parquet_report = make_reports.create_comment_report_from_parquet(dataset_dir)
+    csv_rows = {str(row.pop("user_id")): row for row in csv_report.to_dict("records")}
+    parquet_rows = {
+        str(row.pop("user_id")): row for row in parquet_report.to_dict("records")
+    }
+    return [
+        (user_id, csv_rows.get(user_id), parquet_rows.get(user_id))
+        for user_id in sorted(csv_rows.keys() | parquet_rows.keys())
+        if csv_rows.get(user_id) != parquet_rows.get(user_id)
+    ]
+
+
+def run_benchmarks(config: CorpusConfig, repeat: int = 3, only: list = None) -> tuple:
+    """
+    Generate a corpus in the current directory and benchmark each stage
+
+    Returns:
+        tuple: BenchmarkResult of each stage, in pipeline order, and the
+            comment report mismatches of compare_comment_reports
+    """
+    # Imported here so their relative DATA_ROOT paths resolve in the work dir
+    import make_reports
+    import twitch
+    from utils import chat_store
+
+    chat_files = write_corpus(twitch.DATA_ROOT, config)
+    patterns = {
+        "cheer_pattern": twitch.CHEER_PATTERN,
+        "subscribed_pattern": twitch.SUBSCRIBED_PATTERN,
+        "gifting_pattern": twitch.GIFTING_PATTERN,
+    }
+
+    def export_chats():
+        return {
+            (user_id, file_path): twitch.export_single_user_chats_to_csv(
+                file_path, user_id, write_csv=False
+            )["clip_chat_df"]
+            for user_id, file_paths in chat_files.items()
+            for file_path in file_paths
+        }
+
+    def each(stage):
+        def run(chat_dfs):
+            for chat_df in chat_dfs.values():
+                stage(chat_df)
+
+        return run
+
+    def copies(chat_dfs):
+        return lambda: ({key: df.copy() for key, df in chat_dfs.items()},)
+
+    raw_dfs = export_chats()
+    regex_dfs = {
+        key: twitch.re_message(df.copy(), "raw_message", **patterns)
+        for key, df in raw_dfs.items()
+    }
+    emoji_dfs = {
+        key: twitch.get_emoji_meaning(df.copy(), "raw_message")
+        for key, df in regex_dfs.items()
+    }
+    enriched_dfs = {
+        key: twitch.deal_with_badges(df.copy()) for key, df in emoji_dfs.items()
+    }
+
+    report_dir = os.path.join(twitch.DATA_ROOT, "comments_report_inputs")
+    write_comment_report_inputs(
+        {
+            user_id: pd.concat(
+                df
+                for (df_user_id, _), df in enriched_dfs.items()
+                if df_user_id == user_id
+            )
+            for user_id in chat_files
+        },
+        report_dir,
+    )
+    report_mismatches = []
+    if chat_store.pa is not None:
+        dataset_dir = os.path.join(twitch.DATA_ROOT, "comments_report_parquet")
+        for (user_id, file_path), df in enriched_dfs.items():
+            chat_store.write_chat_parquet(
+                df, dataset_dir, user_id, twitch.get_chat_file_id(file_path)
+            )
+        report_mismatches = compare_comment_reports(report_dir, dataset_dir)
+
+    benchmarks = [
+        ("export_single_user_chats_to_csv", lambda: export_chats(), lambda: ()),
+        (
+            "re_message",
+            each(lambda df: twitch.re_message(df, "raw_message", **patterns)),
+            copies(raw_dfs),
+        ),
+        (
+            "get_emoji_meaning",
+            each(lambda df: twitch.get_emoji_meaning(df, "raw_message")),
+            copies(regex_dfs),
+        ),
+        ("deal_with_badges", each(twitch.deal_with_badges), copies(emoji_dfs)),
+        (
+            "deal_with_badge",
+            each(lambda df: df.apply(twitch.deal_with_badge, axis=1)),
+            copies(emoji_dfs),
+        ),
+        (
+            "create_comment_report",
+            lambda: make_reports.create_comment_report(report_dir, cache=None),
+            lambda: (),
+        ),
+        (
+            "make_clips_report",
+            lambda: make_reports.make_clips_report(cache=None),
+            lambda: (),
+        ),
+    ]
+    results = []
+    for name, function, setup in benchmarks:
+        if only and name not in only:
+            continue
+        result = measure(name, function, setup, config.total_messages, repeat)
+        print(
+            f"{name:<34}{result.seconds:>10.3f}s"
+            f"{result.messages_per_second:>14,} msg/s"
+            f"{result.peak_memory_mb:>10.1f} MB"
+        )
+        results.append(result)
+    return results, report_mismatches
+
+
+def compare(results: list, baseline: dict, tolerance: float) -> list:
+    """
+    Benchmarks slower than their baseline by more than tolerance
+
+    Returns:
+        list: (name, baseline seconds, seconds) of each regression
+    """
+    baseline_seconds = {
+        result["name"]: result["seconds"] for result in baseline["results"]
+    }
+    regressions = []
+    for result in results:
+        previous = baseline_seconds.get(result.name)
+        if previous and result.seconds > previous * (1 + tolerance):
+            regressions.append((result.name, previous, result.seconds))
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    defaults = CorpusConfig()
+    parser.add_argument(
+        "--messages-per-clip", type=int, default=defaults.messages_per_clip
+    )
+    parser.add_argument("--clips-per-user", type=int, default=defaults.clips_per_user)
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--authors", type=int, default=defaults.authors)
+    parser.add_argument("--emoji-density", type=float, default=defaults.emoji_density)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", help="benchmark names to run")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    config = defaults._replace(
+        messages_per_clip=args.messages_per_clip,
+        clips_per_user=args.clips_per_user,
+        users=args.users,
+        authors=args.authors,
+        emoji_density=args.emoji_density,
+        seed=args.seed,
+    )
+    baseline_path = os.path.abspath(args.baseline)
+    output_path = args.output and os.path.abspath(args.output)
+    print(
+        f"{config.total_messages:,} messages in {config.users * config.clips_per_user} clips"
+    )
+
+    cwd = os.getcwd()
+    sys.path.insert(0, cwd)
+    with tempfile.TemporaryDirectory(prefix="twitch-bench-") as work_dir:
+        os.chdir(work_dir)
+        try:
+            results, report_mismatches = run_benchmarks(config, args.repeat, args.only)
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "corpus": {
+            field: getattr(config, field)
+            for field in [
+                "messages_per_clip",
+                "clips_per_user",
+                "users",
+                "authors",
+                "emoji_density",
+                "seed",
+            ]
+        },
+        "results": [result._asdict() for result in results],
+    }
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    status = 0
+    for user_id, csv_row, parquet_row in report_mismatches:
+        print(f"REPORT MISMATCH user {user_id}: CSV {csv_row} != Parquet {parquet_row}")
+        status = 1
+    if args.compare:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if baseline.get("corpus") != report["corpus"]:
+            print(f"Warning: baseline corpus differs: {baseline.get('corpus')}")
+        regressions = compare(results, baseline, args.tolerance)
+        for name, previous, seconds in regressions:
+            print(
+                f"REGRESSION {name}: {previous:.3f}s -> {seconds:.3f}s "
+                f"(+{seconds / previous - 1:.0%})"
+            )
+        status = 1 if regressions else status
+    if args.save_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {baseline_path}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,9 @@
 import os
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from utils.chat_store import read_chat_parquet
+from utils.report_cache import REPORT_CACHE_FILE, ReportCache, file_fingerprint
 
 DATA_ROOT = "data"
 CLIP_DIRECTORY = f"{DATA_ROOT}/clips"
@@ -8,37 +11,214 @@ CHAT_DIRECTORY = f"{DATA_ROOT}/comments"
 VIDEO_DIRECTORY = f"{DATA_ROOT}/videos"
 MP4_DIRECTORY = f"{DATA_ROOT}/mp4"
 CHAT_CSV_DIRECTORY = f"{DATA_ROOT}/comments_csv"
+CHAT_PARQUET_DIRECTORY = f"{DATA_ROOT}/comments_parquet"
 
 
-def create_comment_report(messaged_re_dir):
-    # NEED TO CHECK
-    user_reports_list = []
-    for file in os.listdir(messaged_re_dir):
-        user_id = file.split(".")[0]
-        if user_id.isdigit():
-            full_file_path = os.path.join(messaged_re_dir, file)
-            df = pd.read_csv(full_file_path, index_col=0)
-
-            message_count = df["message_id"].count()
-            distinct_clip_count = df["clip_id"].nunique()
-            subscribed_count = df[df["comment_type"] == 1]["tier_level"].count()
-            gifting_count = df[df["comment_type"] == 2]["gifting_count"].count()
-            gifting_amount = int(df[df["comment_type"] == 2]["gifting_count"].sum())
-            cheer_count = df[df["comment_type"] == 3]["message"].count()
-            cheer_amount = int(df[df["comment_type"] == 3]["cheer"].sum())
-            user_report = {
+# Columns the comment report needs, with the dtypes they are parsed as
+COMMENT_REPORT_DTYPES = {
+    "message_id": "string",
+    "clip_id": "string",
+    "comment_type": "float32",
+    "tier_level": "float32",
+    "gifting_count": "float64",
+    "message": "string",
+    "cheer": "float64",
+}
+COMMENT_REPORT_CHUNKSIZE = 200_000
+COMMENT_REPORT_COLUMNS = [
+    "user_id",
+    "message_count",
+    "distinct_clip_count",
+    "subscribed_count",
+    "gifting_count",
+    "gifting_amount",
+    "cheer_count",
+    "cheer_amount",
+]
+CLIP_REPORT_DTYPES = {"video_id": "string", "duration": "float64"}
+
+report_cache = ReportCache(REPORT_CACHE_FILE)
+
+
+def aggregate_files(
+    kind: str,
+    function,
+    file_paths: list,
+    args: list,
+    cache: ReportCache = report_cache,
+    max_workers=None,
+) -> list:
+    """
+    Partial aggregates of many files, recomputing only files that changed
+
+    Args:
+        kind (str): cache namespace, e.g. "comments"
+        function: picklable callable, run as function(*args[i]) in a worker
+            process for every file whose cached partial is out of date
+        file_paths (list): input files, fingerprinted by size and mtime
+        args (list): argument tuple for each file
+        cache (ReportCache, optional): None recomputes everything
+
+    Returns:
+        list: one partial per file, in file_paths order
+    """
+    partials = {}
+    stale = []
+    for file_path, file_args in zip(file_paths, args):
+        fingerprint = file_fingerprint(file_path)
+        partial = cache.get(kind, file_path, fingerprint) if cache else None
+        if partial is None:
+            stale.append((file_path, fingerprint, file_args))
+        else:
+            partials[file_path] = partial
+    if stale:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(function, *zip(*(item[2] for item in stale)))
+            for (file_path, fingerprint, _), partial in zip(stale, results):
+                partials[file_path] = partial
+                if cache:
+                    cache.put(kind, file_path, fingerprint, partial)
+    if cache:
+        cache.prune(kind, file_paths)
+    return [partials[file_path] for file_path in file_paths]
+
+
+def comment_partial(df: pd.DataFrame, user_id) -> pd.DataFrame:
+    """
+    Per-(user, clip) sums of every comment metric, in one groupby pass
+
+    Partials from any number of chunks or files can be merged with
+    merge_comment_partials.
+
+    Args:
+        user_id: a user id, or a Series of them aligned with df
+    """
+    comment_type = df["comment_type"]
+    return (
+        pd.DataFrame(
+            {
                 "user_id": user_id,
-                "message_count": message_count,
-                "distinct_clip_count": distinct_clip_count,
-                "subscribed_count": subscribed_count,
-                "gifting_count": gifting_count,
-                "gifting_amount": gifting_amount,
-                "cheer_count": cheer_count,
-                "cheer_amount": cheer_amount,
-            }
-            user_reports_list.append(user_report)
-    report_df = pd.DataFrame(data=user_reports_list)
+                "clip_id": df["clip_id"],
+                "message_count": df["message_id"].notna(),
+                "subscribed_count": (comment_type == 1) & df["tier_level"].notna(),
+                "gifting_count": (comment_type == 2) & df["gifting_count"].notna(),
+                "gifting_amount": df["gifting_count"]
+                .where(comment_type == 2)
+                .fillna(0),
+                "cheer_count": (comment_type == 3) & df["message"].notna(),
+                "cheer_amount": df["cheer"].where(comment_type == 3).fillna(0),
+            },
+            index=df.index,
+        )
+        .groupby(["user_id", "clip_id"], dropna=False, sort=False, observed=True)
+        .sum()
+    )
+
+
+def merge_comment_partials(partials: list) -> pd.DataFrame:
+    """Combine comment partials into one report row per user"""
+    partials = [partial for partial in partials if not partial.empty]
+    if not partials:
+        return pd.DataFrame(columns=COMMENT_REPORT_COLUMNS)
+    per_clip = (
+        pd.concat(partials)
+        .groupby(level=["user_id", "clip_id"], dropna=False, sort=False, observed=True)
+        .sum()
+        .reset_index()
+    )
+    report = per_clip.groupby("user_id", sort=False, observed=True).agg(
+        message_count=("message_count", "sum"),
+        distinct_clip_count=("clip_id", "count"),
+        subscribed_count=("subscribed_count", "sum"),
+        gifting_count=("gifting_count", "sum"),
+        gifting_amount=("gifting_amount", "sum"),
+        cheer_count=("cheer_count", "sum"),
+        cheer_amount=("cheer_amount", "sum"),
+    )
+    return report.astype("int64").reset_index()[COMMENT_REPORT_COLUMNS]
+
+
+def aggregate_comment_file(
+    file_path: str, user_id: str, chunksize: int = COMMENT_REPORT_CHUNKSIZE
+) -> pd.DataFrame:
+    """Read only the report columns of one chat CSV, chunk by chunk, into a partial"""
+    partials = [
+        comment_partial(chunk, user_id)
+        for chunk in pd.read_csv(
+            file_path,
+            usecols=list(COMMENT_REPORT_DTYPES),
+            dtype=COMMENT_REPORT_DTYPES,
+            chunksize=chunksize,
+        )
+    ]
+    if not partials:
+        return pd.DataFrame()
+    return (
+        pd.concat(partials)
+        .groupby(level=["user_id", "clip_id"], dropna=False, sort=False, observed=True)
+        .sum()
+    )
+
+
+def create_comment_report(messaged_re_dir, max_workers=None, cache=report_cache):
+    """
+    Per-user comment metrics of every '<user_id>.csv' in messaged_re_dir
+
+    Changed files are aggregated in worker processes, largest first;
+    unchanged ones reuse their cached partial. Only the small partials
+    are merged here.
+    """
+    files = sorted(
+        (
+            os.path.join(messaged_re_dir, file)
+            for file in os.listdir(messaged_re_dir)
+            if file.split(".")[0].isdigit()
+        ),
+        key=os.path.getsize,
+        reverse=True,
+    )
+    partials = aggregate_files(
+        "comments",
+        aggregate_comment_file,
+        files,
+        [(file, os.path.basename(file).split(".")[0]) for file in files],
+        cache=cache,
+        max_workers=max_workers,
+    )
+    report_df = merge_comment_partials(partials)
+    report_df.to_csv("data/reports.csv")
+    return report_df
+
+
+def create_comment_report_from_parquet(
+    dataset_dir=CHAT_PARQUET_DIRECTORY, started_at=None, ended_at=None
+):
+    """Same report as create_comment_report, read from the Parquet chat dataset
+
+    Args:
+        started_at (str, optional): first clip date, e.g. "2025-05-01"
+        ended_at (str, optional): clip dates before this one
+    """
+    df = read_chat_parquet(
+        dataset_dir,
+        columns=[
+            "broadcaster_id",
+            "message_id",
+            "clip_id",
+            "comment_type",
+            "tier_level",
+            "gifting_count",
+            "message",
+            "cheer",
+        ],
+        started_at=started_at,
+        ended_at=ended_at,
+    )
+    report_df = merge_comment_partials(
+        [comment_partial(df, df["broadcaster_id"].astype(str))]
+    )
     report_df.to_csv("data/reports.csv")
+    return report_df
 
 
 def get_user_clip_info(user_id):
@@ -51,7 +231,11 @@ def get_user_clip_info(user_id):
         dictionary: count of clips
     """
 
-    user_df = pd.read_csv(f"{CLIP_DIRECTORY}/{user_id}.csv")
+    user_df = pd.read_csv(
+        f"{CLIP_DIRECTORY}/{user_id}.csv",
+        usecols=list(CLIP_REPORT_DTYPES),
+        dtype=CLIP_REPORT_DTYPES,
+    )
     count_of_clips = len(user_df)
     clips_df_with_video_id = user_df[user_df["video_id"].notna()]
     count_of_clips_with_video_id = len(clips_df_with_video_id)
@@ -64,15 +248,24 @@ def get_user_clip_info(user_id):
     }
 
 
-def make_clips_report():
+def make_clips_report(max_workers=None, cache=report_cache):
+    user_ids = [
+        user_file.stem
+        for user_file in Path(CLIP_DIRECTORY).glob("*.csv")
+        if user_file.stem.isdigit()
+    ]
     rows = []
-    files = list(Path(CLIP_DIRECTORY).glob("*.csv"))
-    for user_file in files:
-        user_id = user_file.stem
-        if user_id.isdigit():
-            user_clips = get_user_clip_info(user_id)
-            user_clips["user_id"] = user_id
-            rows.append(user_clips)
+    partials = aggregate_files(
+        "clips",
+        get_user_clip_info,
+        [f"{CLIP_DIRECTORY}/{user_id}.csv" for user_id in user_ids],
+        [(user_id,) for user_id in user_ids],
+        cache=cache,
+        max_workers=max_workers,
+    )
+    for user_id, user_clips in zip(user_ids, partials):
+        user_clips["user_id"] = user_id
+        rows.append(user_clips)
     report = pd.DataFrame(rows)
     report.to_csv(f"{CLIP_DIRECTORY}/reports.csv", index=False)
 
@@ -1,20 +1,53 @@
-import demoji
-import json
+import asyncio
+import numpy as np
 import os
 import pandas as pd
+import queue
 import requests
-import subprocess
-import time
+import threading
 
-from typing import Union
+from functools import lru_cache
+from typing import Callable, NamedTuple, Union
 from tqdm import tqdm
 
 from chat_downloader import ChatDownloader
 from chat_downloader.errors import NoChatReplay
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from datetime import datetime, timedelta
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from datetime import datetime, timedelta, timezone
+from utils.chat_schema import CHAT_SCHEMA, apply_chat_schema, empty_chat_column
+from utils.chat_store import write_chat_parquet
+from utils.clip_index import CLIP_INDEX_FILE, ClipIndex
+from utils.emoji_engine import get_emoji_engine
+from utils.event_log import compact_events, emit_event
+from utils.clip_downloader import ClipDownloader
+from utils.helix import HELIX_MAX_IDS, AsyncHelixClient, HelixClient, RateLimiter
+from utils.helix_cache import HELIX_CACHE_FILE, HelixCache, is_closed_window
+from utils.ledger import (
+    LEDGER_FILE,
+    STAGE_CHATS,
+    STAGE_CLIPS,
+    STAGE_CSV,
+    STAGE_MP4,
+    STATUS_DONE,
+    JobLedger,
+    file_checksum,
+)
+from utils.metrics import METRICS_DIRECTORY, get_metrics
 from utils.utils import *
-from utils.process_file import read_or_create_csv_file, read_json_file
+from utils.process_file import (
+    CHAT_FILE_SUFFIXES,
+    get_chat_file_id,
+    is_chat_file,
+    read_chat_replay,
+    read_or_create_csv_file,
+    write_chat_file,
+)
 
 CLIENT_ID = "olj1zlf45mtffa1166zd8b1ersrew3"
 AUTHORIZATION = "Bearer "
@@ -26,9 +59,23 @@ CHAT_DIRECTORY = f"{DATA_ROOT}/comments"
 VIDEO_DIRECTORY = f"{DATA_ROOT}/videos"
 MP4_DIRECTORY = f"{DATA_ROOT}/mp4"
 CHAT_CSV_DIRECTORY = f"{DATA_ROOT}/comments_csv"
+CHAT_PARQUET_DIRECTORY = f"{DATA_ROOT}/comments_parquet"
 
 USERS_INFO_FILE = f"{DATA_ROOT}/users_info.csv"
 
+# "json" (pretty-printed array), "ndjson.gz" or "ndjson.zst" (needs zstandard)
+CHAT_STORAGE_FORMAT = "ndjson.gz"
+# Enriched chats: "parquet" (partitioned dataset, needs pyarrow) or "csv"
+CHAT_OUTPUT_FORMAT = "parquet"
+
+# Clip listing: Helix page size and concurrent time-window sharding
+CLIPS_PAGE_SIZE = 100
+CLIP_WINDOW_SHARDS = 8
+CLIP_MIN_WINDOW = timedelta(hours=1)
+# Clips that had no chat replay are not asked for it again until this passes
+NO_REPLAY_RECHECK_INTERVAL = timedelta(days=30)
+NO_REPLAY_ERROR = "NoChatReplay"
+
 CHEER_PATTERN = r"Cheer(\d+)(?:\s|$)"
 SUBSCRIBED_PATTERN = r"subscribed at Tier (\d+).*?(\d+|\w+) month"
 GIFTING_PATTERN = r"gifting (\d+) Tier (\d+) Subs to (\w+)'s community"
@@ -38,155 +85,427 @@ CHAT_TO_CSV_ERROR_LOG = f"{CHAT_DIRECTORY}/chats_to_df_errors.csv"
 CHAT_IS_EMPTY_LOG = f"{CHAT_DIRECTORY}/chats_to_df_empty.csv"
 CHAT_TO_CSV_ERROR_LOG_COLUMNS = ["datetime", "user_id", "file_path", "message"]
 CHAT_IS_EMPTY_LOG_COLUMNS = ["datetime", "user_id", "file_path"]
+DOWNLOAD_MP4_FAIL_LOG = f"{DATA_ROOT}/donload_mp4_fail.csv"
+DOWNLOAD_MP4_FAIL_LOG_COLUMNS = ["user_id", "clip_id", "status", "output_path", "error"]
 RE_MESSAGE_LOG = f"{CHAT_DIRECTORY}/re_message.log"
 FETCH_CLIPS_LOG = f"{CLIP_DIRECTORY}/fetch_data.log"
 PROCESS_CHAT_CSV_LOG = f"{CHAT_CSV_DIRECTORY}/process_chat_csv.txt"
 DOWNLOAD_MP4_LOG = f"{MP4_DIRECTORY}/download_mp4.txt"
+VIDEO_DOWNLOAD_WORKERS = 8
+VIDEO_QUALITIES = ["360", "480", "720", "source"]
+VIDEO_PRIORITY = "newest"
+# priority -> (VideoJob field, descending)
+VIDEO_PRIORITIES = {
+    "newest": ("created_at", True),
+    "oldest": ("created_at", False),
+    "most_viewed": ("view_count", True),
+}
+
+# "streaming" overlaps clip fetching, chat download, chat processing and
+# video downloads; "staged" runs each step for every user before the next
+PIPELINE_MODE = "streaming"
+STREAM_USER_QUEUE_SIZE = 2  # users whose clip lists wait for chat download
+STREAM_MAX_PENDING_CLIPS = 64  # clips waiting for processing, and for video
+
+
+# event type -> CSV view produced by export_event_views()
+EVENT_CSV_VIEWS = {
+    "chat_to_csv_error": {
+        "output_file": CHAT_TO_CSV_ERROR_LOG,
+        "columns": CHAT_TO_CSV_ERROR_LOG_COLUMNS,
+    },
+    "chat_is_empty": {
+        "output_file": CHAT_IS_EMPTY_LOG,
+        "columns": CHAT_IS_EMPTY_LOG_COLUMNS,
+    },
+    "download_mp4_fail": {
+        "output_file": DOWNLOAD_MP4_FAIL_LOG,
+        "columns": DOWNLOAD_MP4_FAIL_LOG_COLUMNS,
+        "subset": ["clip_id"],
+    },
+}
+
+
+job_ledger = JobLedger(LEDGER_FILE)
+clip_index = ClipIndex(CLIP_INDEX_FILE)
+clip_downloader = ClipDownloader()
+pipeline_metrics = get_metrics()
+helix_client = HelixClient(
+    TWITCH_HEADERS, cache=HelixCache(HELIX_CACHE_FILE), metrics=pipeline_metrics
+)
 
 
 class Twitch:
     def __init__(
-        self, started_at: Optional[str] = None, ended_at: Optional[str] = None
+        self,
+        started_at: Optional[str] = None,
+        ended_at: Optional[str] = None,
+        ledger: JobLedger = job_ledger,
+        client: HelixClient = helix_client,
+        incremental: bool = False,
+        index: ClipIndex = clip_index,
     ):
         self.started_at = started_at
         self.ended_at = ended_at
+        self.incremental = incremental
+        self.index = index
+        self.ledger = ledger
+        self.client = client
 
     def get_users_by_login_names(self, names: list):
-
-        url = make_url("https://api.twitch.tv/helix/users", "login", names)
-        payload = {}
-        response = requests.request(
-            "GET", url, headers=TWITCH_HEADERS, data=payload
-        ).json()
-        return response
+        users = []
+        for batch in chunked(names, HELIX_MAX_IDS):
+            response = self.client.get("/users", params={"login": batch})
+            users.extend(response.get("data", []))
+        return {"data": users}
 
     def get_user_follower_count(self, user_id: str):
-        url = "https://api.twitch.tv/helix/channels/followers"
-
         payload = {"broadcaster_id": user_id}
-        response = requests.request("GET", url, headers=TWITCH_HEADERS, params=payload)
+        response = self.client.get("/channels/followers", params=payload)
+
+        return response.get("total", 0)
+
+    async def fetch_users_info(self, names: list) -> pd.DataFrame:
+        """
+        Look up users and their follower totals concurrently
+
+        Logins are resolved in batches of HELIX_MAX_IDS, then every
+        follower total is requested at once; all calls share the sync
+        client's credentials, rate limiter, cache and metrics. A failed
+        follower lookup is logged and counted as 0.
+
+        Returns:
+            pd.DataFrame: one row per user found, with twitch_user_id and
+                follower_count columns
+        """
+        async with AsyncHelixClient(
+            self.client.headers,
+            base_url=self.client.base_url,
+            rate_limiter=self.client.rate_limiter,
+            cache=self.client.cache,
+            metrics=self.client.metrics,
+        ) as client:
+            user_pages = await asyncio.gather(
+                *(
+                    client.get("/users", params={"login": batch})
+                    for batch in chunked(names, HELIX_MAX_IDS)
+                )
+            )
+            users = [user for page in user_pages for user in page.get("data", [])]
+
+            async def get_follower_count(user_id: str) -> int:
+                try:
+                    page = await client.get(
+                        "/channels/followers", params={"broadcaster_id": user_id}
+                    )
+                except Exception as e:
+                    write_log(FETCH_CLIPS_LOG, f"{user_id}: {e}")
+                    return 0
+                return int(page.get("total", 0))
+
+            follower_counts = await asyncio.gather(
+                *(get_follower_count(user["id"]) for user in users)
+            )
+
+        user_info_df = pd.DataFrame(users).rename(columns={"id": "twitch_user_id"})
+        if user_info_df.empty:
+            return user_info_df
+        user_info_df["twitch_user_id"] = user_info_df["twitch_user_id"].astype(str)
+        user_info_df["follower_count"] = follower_counts
+        return user_info_df
 
-        return response.json().get("total", 0)
+    def get_users_info(self, names: list) -> pd.DataFrame:
+        """Blocking wrapper around fetch_users_info"""
+        return asyncio.run(self.fetch_users_info(names))
 
     def get_clip_info(
         self,
         user_id: str,
         started_at: Optional[str] = None,
         ended_at: Optional[str] = None,
+        shards: int = CLIP_WINDOW_SHARDS,
+        min_window: timedelta = CLIP_MIN_WINDOW,
     ):
         """
         Efficiently retrieve clip information with concurrent pagination
 
+        The [started_at, ended_at) range is split into `shards` windows that
+        are paginated concurrently. A window whose first page is full and
+        has a next cursor is dense, and is split in half again (down to
+        `min_window`) instead of being paged through serially. Clips that
+        fall on a window boundary are de-duplicated by id.
+
         :param user_id: Twitch user ID
         :param started_at: Start date for clips retrieval
         :param started_at: End date for clips retrieval
-        :return: Dictionary of clip data
+        :param shards: Number of windows paginated concurrently
+        :param min_window: Windows are not split below this length
+        :return: Dictionary of clip data and the number of pages that failed
         """
-        if not started_at:
-            started_at = f"{(datetime.today()-timedelta(days=90)).strftime('%Y-%m-%d')}T00:00:00Z"
-        if not ended_at:
-            ended_at = f"{datetime.today().strftime('%Y-%m-%d')}T00:00:00Z"
-
+        started_at, ended_at = resolve_clip_window(started_at, ended_at)
         if started_at > ended_at:
             raise Exception("Time range is incorrect.")
 
-        url = "https://api.twitch.tv/helix/clips"
-        result = {"data": []}
-        pagination = None
+        failed_pages = []
 
         def fetch_clips_page(payload):
             """Internal method to fetch a single page of clips"""
             try:
-                response = requests.get(
-                    url, headers=TWITCH_HEADERS, params=payload, timeout=10
-                )
-                response.raise_for_status()
-                return response.json()
+                return self.client.get("/clips", params=payload)
             except requests.RequestException as e:
                 write_log(FETCH_CLIPS_LOG, f"Error fetching clips: {e}")
+                failed_pages.append(payload)
                 return {"data": [], "pagination": {}}
 
-        with ThreadPoolExecutor(max_workers=30) as executor:
+        def fetch_clips_window(window_start: datetime, window_end: datetime):
+            """Page through one window, or hand back its halves if it is dense"""
+            clips = []
+            pagination = None
+            first_page = True
             while True:
-                # Prepare payload
                 payload = {
                     "broadcaster_id": user_id,
-                    "started_at": started_at,
-                    "ended_at": ended_at,
+                    "started_at": format_rfc3339(window_start),
+                    "ended_at": format_rfc3339(window_end),
+                    "first": CLIPS_PAGE_SIZE,
                 }
                 if pagination:
                     payload["after"] = pagination
-
-                # Execute request with rate limiting
-                time.sleep(0.2)
-                future = executor.submit(fetch_clips_page, payload)
-                r_data = future.result()
-
-                # Process retrieved data
-                clips = r_data.get("data", [])
-                result["data"].extend(clips)
-
-                # Check pagination and clip limit
+                r_data = fetch_clips_page(payload)
+                clips.extend(r_data.get("data", []))
                 pagination = r_data.get("pagination", {}).get("cursor")
                 if not pagination:
-                    break
-
-        return result
+                    return clips, []
+                if first_page and window_end - window_start >= 2 * min_window:
+                    middle = window_start + (window_end - window_start) / 2
+                    return clips, [(window_start, middle), (middle, window_end)]
+                first_page = False
+
+        windows = split_time_range(
+            parse_rfc3339(started_at), parse_rfc3339(ended_at), shards
+        )
+        clips_by_id = {}
+        with ThreadPoolExecutor(max_workers=30) as executor:
+            pending = {executor.submit(fetch_clips_window, *w) for w in windows}
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    clips, sub_windows = future.result()
+                    for clip in clips:
+                        clips_by_id.setdefault(clip["id"], clip)
+                    for sub_window in sub_windows:
+                        pending.add(executor.submit(fetch_clips_window, *sub_window))
+
+        return {"data": list(clips_by_id.values()), "failed_pages": len(failed_pages)}
 
     def summary_user_clips_to_csv(self, user: str):
+        if self.incremental:
+            return self.sync_user_clips_to_csv(user)
         file_path = f"{CLIP_DIRECTORY}/{user}.csv"
-        summary_clips = read_or_create_csv_file(file_path)
-        data = self.get_clip_info(
-            user, started_at=self.started_at, ended_at=self.ended_at
-        ).get("data")
+        started_at, ended_at = resolve_clip_window(self.started_at, self.ended_at)
+        # A closed window is only fetched once and reruns reuse the summary
+        # file; a window still open can gain clips, so it is always fetched
+        window = f"{started_at}|{ended_at}"
+        if is_closed_window({"ended_at": ended_at}) and not self.ledger.should_run(
+            STAGE_CLIPS, user, input_checksum=window
+        ):
+            return read_or_create_csv_file(file_path)
+
+        self.ledger.start(STAGE_CLIPS, user, input_checksum=window)
+        clip_info = self.get_clip_info(user, started_at=started_at, ended_at=ended_at)
+        data = clip_info.get("data")
+        # Clips of the pages that did come back are kept, but the window
+        # stays unfinished so the next run fetches it again
+        failed_pages = clip_info["failed_pages"]
+        if failed_pages:
+            self.ledger.fail(STAGE_CLIPS, user, error=f"{failed_pages} pages failed")
         if data:
             clip_summary = pd.DataFrame(data=data)
             clip_summary.rename(columns={"id": "clip_id"}, inplace=True)
 
             clip_summary = clip_summary[clip_summary["game_id"] == "21779"]
 
-            concat_df_to_file(
-                [summary_clips, clip_summary], file_path, subset=["clip_id"]
+            # Only clips missing from the summary file are appended
+            stored_clip_ids = self.index.members(
+                STAGE_CLIPS, user, seed=lambda: read_clip_ids(file_path)
             )
+            new_clips = clip_summary[~clip_summary["clip_id"].isin(stored_clip_ids)]
+            append_df_to_file(new_clips, file_path)
+            self.index.add(STAGE_CLIPS, user, new_clips["clip_id"])
+            if not failed_pages:
+                self.ledger.finish(STAGE_CLIPS, user, output_path=file_path)
             return clip_summary
-        else:
+        elif not failed_pages:
             write_log(FETCH_CLIPS_LOG, f"{user} has no clips")
+            self.ledger.finish(STAGE_CLIPS, user)
+        return pd.DataFrame()
+
+    def get_clips_watermark(self, user: str) -> tuple:
+        """
+        Latest created_at synced for a user and the clip ids created then
+
+        Users synced before watermarks existed get one from their summary
+        file, read once.
+        """
+        watermark = self.ledger.get_watermark(STAGE_CLIPS, user)
+        if watermark is not None:
+            return watermark
+        file_path = f"{CLIP_DIRECTORY}/{user}.csv"
+        try:
+            clips = pd.read_csv(
+                file_path, usecols=["clip_id", "created_at"], dtype=str
+            ).dropna()
+        except (FileNotFoundError, ValueError, pd.errors.EmptyDataError):
+            return None, set()
+        if clips.empty:
+            return None, set()
+        latest = clips["created_at"].max()
+        return latest, set(clips.loc[clips["created_at"] == latest, "clip_id"])
+
+    def sync_user_clips_to_csv(self, user: str) -> pd.DataFrame:
+        """
+        Fetch only clips newer than the user's high-water mark and append them
+
+        Helix's started_at is inclusive, so the ids created in the watermark's
+        second are remembered and skipped. If any page fails, nothing is
+        appended and the watermark stays put, so the next sync retries the
+        same range.
+
+        Returns:
+            pd.DataFrame: the newly appended clips
+        """
+        file_path = f"{CLIP_DIRECTORY}/{user}.csv"
+        watermark, seen_ids = self.get_clips_watermark(user)
+        started_at = max(filter(None, [self.started_at, watermark]), default=None)
+        ended_at = self.ended_at or format_rfc3339(datetime.now(timezone.utc))
+        if started_at and started_at >= ended_at:
             return pd.DataFrame()
 
+        clip_info = self.get_clip_info(user, started_at=started_at, ended_at=ended_at)
+        if clip_info["failed_pages"]:
+            write_log(FETCH_CLIPS_LOG, f"{user}: incremental sync incomplete")
+            return pd.DataFrame()
+        new_clips = [
+            clip
+            for clip in clip_info["data"]
+            if clip["id"] not in seen_ids
+            and (watermark is None or clip["created_at"] >= watermark)
+        ]
+        if not new_clips:
+            return pd.DataFrame()
+
+        latest = max(clip["created_at"] for clip in new_clips)
+        if latest != watermark:
+            seen_ids = set()
+        seen_ids |= {clip["id"] for clip in new_clips if clip["created_at"] == latest}
+
+        clip_summary = pd.DataFrame(data=new_clips)
+        clip_summary.rename(columns={"id": "clip_id"}, inplace=True)
+        clip_summary = clip_summary[clip_summary["game_id"] == "21779"]
+        append_df_to_file(clip_summary, file_path)
+        self.index.add(STAGE_CLIPS, user, clip_summary["clip_id"])
+        self.ledger.set_watermark(STAGE_CLIPS, user, latest, seen_ids)
+        self.ledger.finish(STAGE_CLIPS, user, output_path=file_path)
+        return clip_summary
+
 
 class ChatDownload:
-    def __init__(self):
+    def __init__(
+        self,
+        storage_format: str = CHAT_STORAGE_FORMAT,
+        ledger: JobLedger = job_ledger,
+        index: ClipIndex = clip_index,
+        no_replay_recheck: timedelta = NO_REPLAY_RECHECK_INTERVAL,
+    ):
         self.downloader = ChatDownloader()
+        self.storage_format = storage_format
+        self.file_suffix = CHAT_FILE_SUFFIXES[storage_format]
+        self.ledger = ledger
+        self.index = index
+        self.no_replay_recheck = no_replay_recheck
+
+    def get_clips_without_replay(self, user_id) -> dict:
+        """
+        Clips recently found to have no chat replay, from the ledger
+
+        Returns:
+            dict: clip_id -> failure reason, for failures newer than
+                no_replay_recheck
+        """
+        return self.ledger.failed_clip_ids(
+            STAGE_CHATS,
+            user_id,
+            error_prefix=NO_REPLAY_ERROR,
+            since=datetime.now() - self.no_replay_recheck,
+        )
 
     def download_and_save_chats_from_clips(
-        self, user_id, output_directory: str, clip_urls: dict[str, str]
+        self,
+        user_id,
+        output_directory: str,
+        clip_urls: dict[str, str],
+        on_chats: Optional[Callable[[str, str], None]] = None,
     ):
+        """
+        Download the chat replay of every clip not stored yet
+
+        Args:
+            on_chats (callable, optional): called with (clip_id, chat file
+                path) from the download thread as soon as a clip's chats
+                are on disk; it may block to slow the downloads down. If it
+                raises, the error is logged and the clip's processing is
+                marked failed in the ledger
+        """
         os.makedirs(output_directory, exist_ok=True)
         clip_id_without_chat_replay = []
         clip_url_without_chat_replay = []
 
-        file_names_without_extension = [
-            os.path.splitext(file)[0]
-            for file in os.listdir(output_directory)
-            if os.path.isfile(os.path.join(output_directory, file))
-        ]
+        stored_clip_ids = self.index.members(
+            STAGE_CHATS, user_id, seed=lambda: list_chat_clip_ids(output_directory)
+        )
+        without_replay = self.get_clips_without_replay(user_id)
 
         def process_clip(clip_id, clip_url):
-            if clip_id in file_names_without_extension:
+            if clip_id in stored_clip_ids:
                 return None
+            if clip_id in without_replay:
+                return (clip_id, clip_url)
+            self.ledger.start(STAGE_CHATS, user_id, clip_id)
             try:
-                chats = self.downloader.get_chat(clip_url)
-                with open(
-                    f"{output_directory}/{clip_id}.json", "w", encoding="utf-8"
-                ) as f:
-                    json.dump(list(chats), f, ensure_ascii=False, indent=4)
-            except NoChatReplay:
+                with pipeline_metrics.timer("download_chat"):
+                    chats = self.downloader.get_chat(clip_url)
+                    output_path = write_chat_file(
+                        chats,
+                        f"{output_directory}/{clip_id}{self.file_suffix}",
+                        self.storage_format,
+                    )
+                pipeline_metrics.count("download_chat", "clips")
+                pipeline_metrics.count(
+                    "download_chat", "bytes", os.path.getsize(output_path)
+                )
+                self.ledger.finish(STAGE_CHATS, user_id, clip_id, output_path)
+                self.index.add(STAGE_CHATS, user_id, [clip_id])
+            except NoChatReplay as e:
+                self.ledger.fail(
+                    STAGE_CHATS, user_id, clip_id, f"{NO_REPLAY_ERROR}: {e}"
+                )
                 return (clip_id, clip_url)
             except Exception as e:
                 exception_message = (
                     f"process_clip({clip_id},{clip_url}). Exception: {e}"
                 )
                 write_log(CHAT_ERROR_LOG, exception_message)
+                self.ledger.fail(STAGE_CHATS, user_id, clip_id, e)
+            else:
+                if on_chats is not None:
+                    try:
+                        on_chats(clip_id, output_path)
+                    except Exception as e:
+                        exception_message = (
+                            f"on_chats({clip_id},{output_path}). Exception: {e}"
+                        )
+                        write_log(CHAT_ERROR_LOG, exception_message)
+                        self.ledger.fail(STAGE_CSV, user_id, clip_id, e)
             return None
 
         # Using ThreadPoolExecutor to process clips in parallel
@@ -211,6 +530,46 @@ class ChatDownload:
         df.to_csv(f"{CHAT_DIRECTORY}/{user_id}_clips_without_chat.csv", index=False)
 
 
+def parse_rfc3339(timestamp: str) -> datetime:
+    """'2025-05-01T00:00:00Z' -> timezone-aware datetime"""
+    return datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+
+
+def format_rfc3339(timestamp: datetime) -> str:
+    return timestamp.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def resolve_clip_window(
+    started_at: Optional[str] = None, ended_at: Optional[str] = None
+) -> tuple:
+    """Fill in the default clip window: the 90 days up to today"""
+    if not started_at:
+        started_at = (
+            f"{(datetime.today()-timedelta(days=90)).strftime('%Y-%m-%d')}T00:00:00Z"
+        )
+    if not ended_at:
+        ended_at = f"{datetime.today().strftime('%Y-%m-%d')}T00:00:00Z"
+    return started_at, ended_at
+
+
+def split_time_range(started: datetime, ended: datetime, shards: int) -> list:
+    """Split [started, ended) into `shards` consecutive windows of equal length"""
+    shards = max(1, shards)
+    step = (ended - started) / shards
+    bounds = [started + step * i for i in range(shards)] + [ended]
+    return [
+        (window_start, window_end)
+        for window_start, window_end in zip(bounds, bounds[1:])
+        if window_end > window_start
+    ] or [(started, ended)]
+
+
+def export_event_views(views: dict = EVENT_CSV_VIEWS):
+    """Rebuild the CSV error logs from the event log"""
+    for event, view in views.items():
+        compact_events(event, **view)
+
+
 def get_unique_values_from_df_column(df, column):
     df_clean = df[df[column].notna()]
     df_clean[column] = df_clean[column].astype(int, errors="ignore")
@@ -238,298 +597,458 @@ chatdownloader = ChatDownload()
 def export_single_user_chats_to_csv(
     origin_file_path,
     user_id: str,
-    chat_error_file_columns=CHAT_TO_CSV_ERROR_LOG_COLUMNS,
-    chat_empty_file_columns=CHAT_IS_EMPTY_LOG_COLUMNS,
+    write_csv: bool = True,
 ) -> str:
     """
-    1. Read user's all chats file(.json) in "<chat_directory>/<user_id>".
+    1. Read user's all chats file(.json/.ndjson.gz/.ndjson.zst) in "<chat_directory>/<user_id>".
     2. Write all of them into a csv file.
+    Errors and empty chat files are reported to the event log as
+    "chat_to_csv_error" and "chat_is_empty" events (see EVENT_CSV_VIEWS).
     Args:
         user (str): user id
-        origin_file_path: json file
-        chat_error_file_columns (list, optional):
-            Defaults to ["datetime", "user_id", "file_path", "message"].
-        chat_empty_file_columns (list, optional):
-            Defaults to ["datetime", "user_id", "file_path"].
+        origin_file_path: chat file
+        write_csv (bool, optional): write the raw chats to cleaned_clip_path.
+            process_chat_csv turns this off because it writes the enriched
+            chats itself. Defaults to True.
 
     Returns:
         df: chat file
     """
     return_dict = {}
-    chat_error_df = read_or_create_csv_file(
-        CHAT_TO_CSV_ERROR_LOG, columns=chat_error_file_columns
-    )
-    chat_empty_df = read_or_create_csv_file(
-        CHAT_IS_EMPTY_LOG, columns=chat_empty_file_columns
-    )
-    # record error log
-    chat_error_datetime = []
-    chat_error_user = []
-    chat_error_file_path = []
-    chat_error_message = []
-    empty = dict(zip(chat_empty_file_columns, [[], [], []]))
-
-    author_id_list = []
-    messages_list = []
-    message_ids_list = []
-    time_texts_list = []
-    time_in_seconds_list = []
-    clips_id_list = []
-    chats_file_path_list = []
-    badges_list = []
     os.makedirs(f"{CHAT_CSV_DIRECTORY}/{user_id}", exist_ok=True)
     if origin_file_path.endswith(".DS_Store"):
         return None
-    if origin_file_path.endswith(".json"):
-        clip_id = origin_file_path.split("/")[-1].split(".")[0]
+    if is_chat_file(origin_file_path):
+        clip_id = get_chat_file_id(origin_file_path)
         try:
-            df_chat = read_json_file(
-                origin_file_path
-            )  # 'data/chats/100869214/MildBlindingEelFloof-RnekrluTMQ3PlSfh.json'
-            if df_chat.empty:
-                empty.get(chat_empty_file_columns[0]).append(
-                    datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            with pipeline_metrics.timer("export_single_user_chats_to_csv"):
+                chat_columns = read_chat_replay(
+                    origin_file_path
+                )  # 'data/chats/100869214/MildBlindingEelFloof-RnekrluTMQ3PlSfh.json'
+                chat_count = len(chat_columns["message_id"])
+                if chat_count == 0:
+                    emit_event("chat_is_empty", user_id=user_id, file_path=clip_id)
+                else:
+                    chat_columns["time_in_seconds"] = np.frombuffer(
+                        chat_columns["time_in_seconds"], dtype="float64"
+                    )
+                    chat_columns["clip_id"] = pd.Categorical.from_codes(
+                        np.zeros(chat_count, dtype="int8"), categories=[clip_id]
+                    )
+                    clip_chat_df = apply_chat_schema(
+                        pd.DataFrame(data=chat_columns, index=pd.RangeIndex(chat_count))
+                    )
+                    # Kept once per frame rather than copied onto every row
+                    clip_chat_df.attrs["chats_file_path"] = origin_file_path
+                    cleaned_clip_path = f"{CHAT_CSV_DIRECTORY}/{user_id}/{clip_id}.csv"
+                    if write_csv:
+                        clip_chat_df.to_csv(cleaned_clip_path)
+                    return_dict = {
+                        "clip_chat_df": clip_chat_df,
+                        "cleaned_clip_path": cleaned_clip_path,
+                    }
+                pipeline_metrics.count(
+                    "export_single_user_chats_to_csv", "messages", chat_count
                 )
-                empty.get(chat_empty_file_columns[1]).append(user_id)
-                empty.get(chat_empty_file_columns[2]).append(clip_id)
-            # author
-            for i in df_chat["author"]:
-                author_id_list.append(i.get("id"))
-
-                badges_list.append(
-                    [
-                        badge.get("title") if badge.get("title") else []
-                        for badge in i.get("badges", [])
-                    ]
+                pipeline_metrics.count(
+                    "export_single_user_chats_to_csv",
+                    "bytes",
+                    os.path.getsize(origin_file_path),
                 )
-            # message
-            messages = df_chat["message"]
-            messages_list.extend(messages)
-            # message_ids
-            message_ids = df_chat["message_id"]
-            message_ids_list.extend(message_ids)
-            # time_texts
-            time_texts = df_chat["time_text"]
-            time_texts_list.extend(time_texts)
-            # time_in_seconds
-            time_in_seconds = df_chat["time_in_seconds"]
-            time_in_seconds_list.extend(time_in_seconds)
-            # clip id
-            clips_id_list.extend([clip_id for _ in range(len(df_chat))])
-            # chat file path
-            chats_file = [origin_file_path for _ in range(len(df_chat))]
-            chats_file_path_list.extend(chats_file)
-            clip_chat_df = pd.DataFrame(
-                data={
-                    "author_id": author_id_list,
-                    "badges_list": badges_list,
-                    "raw_message": messages_list,
-                    "message_id": message_ids_list,
-                    "time_text": time_texts_list,
-                    "time_in_seconds": time_in_seconds_list,
-                    "clip_id": clips_id_list,
-                    "chats_file_path": chats_file_path_list,
-                }
-            )
-            cleaned_clip_path = f"{CHAT_CSV_DIRECTORY}/{user_id}/{clip_id}.csv"
-            clip_chat_df.to_csv(cleaned_clip_path)
-            return_dict = {
-                "clip_chat_df": clip_chat_df,
-                "cleaned_clip_path": cleaned_clip_path,
-            }
         except Exception as e:
-            chat_error_datetime.append(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-            chat_error_user.append(user_id)
-            chat_error_file_path.append(origin_file_path)
-            chat_error_message.append(e)
-        errors_df = pd.DataFrame(
-            dict(
-                zip(
-                    chat_error_file_columns,
-                    [
-                        chat_error_datetime,
-                        chat_error_user,
-                        chat_error_file_path,
-                        chat_error_message,
-                    ],
-                )
+            emit_event(
+                "chat_to_csv_error",
+                user_id=user_id,
+                file_path=origin_file_path,
+                message=str(e),
             )
-        )
-        empty_df = pd.DataFrame(empty)
-        errors_df = pd.concat([chat_error_df, errors_df], ignore_index=True)
-        errors_df.to_csv(CHAT_TO_CSV_ERROR_LOG, index=False)
-        empty_df = pd.concat([chat_empty_df, empty_df], ignore_index=True)
-        empty_df.to_csv(CHAT_IS_EMPTY_LOG, index=False)
     return return_dict
 
 
+def get_subscription_badge_month(badge: str) -> int:
+    """Months of subscription shown by a badge, e.g. 3-Month Subscriber -> 3
+
+    Year tiers may be fractional: 1.5-Year Subscriber -> 18
+    """
+    month = re.match(r"(\d+(?:\.\d+)?)-(Month|Year)", badge)
+    if not month:
+        return 1
+    if month.group(2) == "Year":
+        return int(float(month.group(1)) * 12)
+    return int(float(month.group(1)))
+
+
+def classify_badge(badge: str) -> dict:
+    """Map one badge title to the badge_* columns it sets"""
+    features = {}
+    # vip
+    if "VIP" in badge:
+        features["badge_is_vip"] = True
+    # badge_premium_user
+    if ("Prime Gaming" in badge) or ("Turbo" in badge):
+        features["badge_premium_user"] = badge
+    # subscriber
+    if "Subscriber" in badge:  # e.g. 3-Month Subscriber
+        features["badge_has_subscription_badge"] = True
+        features["badge_subscription_badge_month"] = get_subscription_badge_month(badge)
+    # gifter
+    if "Gifter Leader" in badge:  # e.g. Gifter Leader 3
+        features["badge_sub_gift_leader"] = badge.split(" ")[-1]
+    if "Gift Subs" in badge:  # e.g. 10 Gift Subs
+        features["badge_has_sub_gifter_badge"] = True
+        features["badge_sub_gifter_badge_version"] = badge.split(" ")[0]
+    # cheer
+    if "cheer" in badge:  # e.g. cheer 5000
+        features["badge_has_bits_badge"] = True
+        features["badge_bits_badge_cheer"] = badge.split(" ")[-1]
+    if "Bits Leader" in badge:  # e.g. Bits Leader 2
+        features["badge_bits_leader"] = badge.split(" ")[-1]
+    return features
+
+
 def deal_with_badge(row):
-    error_list = []
-    badge_list = row["badges_list"]
-    for badge in badge_list:
-        try:
-            # vip
-            if "VIP" in badge:
-                row["badge_is_vip"] = True
-            # badge_premium_user
-            if ("Prime Gaming" in badge) or ("Turbo" in badge):
-                row["badge_premium_user"] = badge
-            # subscriber
-            if "Subscriber" in badge:  # e.g. 3-Month Subscriber
-                row["badge_has_subscription_badge"] = True
-                month = re.match(r"(\d+)", "Month Subscriber")
-                if month:
-                    row["badge_subscription_badge_month"] = int(month.group())
-                else:
-                    row["badge_subscription_badge_month"] = 1
-            # gifter
-            if "Gifter Leader" in badge:  # e.g. Gifter Leader 3
-                row["badge_sub_gift_leader"] = badge.split(" ")[-1]
-            if "Gift Subs" in badge:  # e.g. 10 Gift Subs
-                row["badge_has_sub_gifter_badge"] = True
-                row["badge_sub_gifter_badge_version"] = badge.split(" ")[0]
-            # cheer
-            if "cheer" in badge:  # e.g. cheer 5000
-                row["badge_has_bits_badge"] = True
-                row["badge_bits_badge_cheer"] = badge.split(" ")[-1]
-            if "Bits Leader" in badge:  # e.g. Bits Leader 2
-                row["badge_bits_leader"] = badge.split(" ")[-1]
-        except Exception as e:
-            error_list.append(row["message_id"])
+    for badge in row["badges_list"]:
+        if isinstance(badge, str):
+            for column, value in classify_badge(badge).items():
+                row[column] = value
     return row
 
 
+def deal_with_badges(chat_df, column="badges_list"):
+    """
+    Fill the badge_* columns for every message at once.
+    Distinct badge titles are classified once into a lookup table, which is
+    joined back onto the exploded badges; when several badges of a message
+    set the same column, the later badge wins, as in deal_with_badge.
+    """
+    badges = chat_df[column].explode()
+    badges = badges[badges.map(lambda badge: isinstance(badge, str))]
+    if badges.empty:
+        return chat_df
+
+    titles = badges.unique()
+    badge_lookup = pd.DataFrame(
+        [classify_badge(title) for title in titles], index=titles, dtype=object
+    )
+    if badge_lookup.empty:
+        return chat_df
+
+    badge_features = badge_lookup.reindex(badges.values)
+    badge_features.index = badges.index
+    message_features = badge_features.groupby(level=0).last()
+
+    for feature in message_features.columns:
+        values = message_features[feature].reindex(chat_df.index)
+        if feature in chat_df:
+            values = values.where(values.notna(), chat_df[feature].astype(object))
+        chat_df[feature] = values
+    return apply_chat_schema(chat_df)
+
+
+class CommentClassifier(NamedTuple):
+    pattern: re.Pattern
+    groups: dict[str, int]
+
+
+@lru_cache(maxsize=None)
+def compile_comment_classifier(
+    cheer_pattern: str, subscribed_pattern: str, gifting_pattern: str
+) -> CommentClassifier:
+    """Combine the comment patterns into one anchored alternation
+
+    Branches are tried in order, so a message is classified as cheer
+    (re.match), then subscribed (re.search), then gifting (re.search),
+    exactly like the original if/elif chain.
+
+    Returns:
+        CommentClassifier: compiled pattern and the 0-based column of each
+            branch's wrapping group in ``Series.str.extract`` output
+    """
+    groups = {}
+    branches = []
+    offset = 0
+    for name, pattern, prefix in [
+        ("cheer", cheer_pattern, ""),
+        ("subscribed", subscribed_pattern, r"[\s\S]*?"),
+        ("gifting", gifting_pattern, r"[\s\S]*?"),
+    ]:
+        groups[name] = offset
+        branches.append(f"{prefix}({pattern})")
+        offset += 1 + re.compile(pattern).groups
+    return CommentClassifier(re.compile(f"^(?:{'|'.join(branches)})"), groups)
+
+
+def _masked_column(index, column: str, *masked_values) -> pd.Series:
+    values = pd.Series(None, index=index, dtype=object)
+    for mask, value in masked_values:
+        values = values.mask(mask, value)
+    return apply_chat_schema(pd.DataFrame({column: values}))[column]
+
+
 # Regular expression message
 def re_message(chat_df, column="raw_message", **kwargs):
-    chat_df["comment_type"] = None
-    # cheer
-    chat_df["cheer_type"] = None
-    chat_df["cheer"] = None
-    # subscribe/gifting
-    chat_df["self_subscribed_type"] = None
-    chat_df["tier_level"] = None
-    chat_df["subscribed_month"] = None
-    chat_df["gifting_count"] = None
-    # author badge
-    chat_df["badge_has_bits_badge"] = False
-    chat_df["badge_bits_badge_cheer"] = None
-    chat_df["badge_bits_leader"] = None
-    chat_df["badge_has_subscription_badge"] = None
-    chat_df["badge_subscription_badge_month"] = None
-    chat_df["badge_has_sub_gifter_badge"] = None
-    chat_df["badge_sub_gifter_badge_version"] = None
-    chat_df["badge_sub_gift_leader"] = None
-    chat_df["badge_premium_user"] = None
-    chat_df["badge_is_vip"] = None
-
-    chat_df["re_message_error"] = None
-
-    cheer_pattern = kwargs.get("cheer_pattern")
-    subscribed_pattern = kwargs.get("subscribed_pattern")
-    gifting_pattern = kwargs.get("gifting_pattern")
-    messages = list(chat_df[column].astype(str))
-    for index, message in enumerate(messages):
-        try:
-            # message
-            if re.match(cheer_pattern, message):  # 小奇點
-                chat_df.loc[index, "comment_type"] = 0
-                chat_df.loc[index, "cheer_type"] = 1
-                chat_df.loc[index, "cheer"] = re.match(cheer_pattern, message).group(1)
-            elif re.search(subscribed_pattern, message):  # 自己訂閱
-                chat_df.loc[index, "comment_type"] = 0
-                chat_df.loc[index, "self_subscribed_type"] = 1
-                chat_df.loc[index, "tier_level"] = re.search(
-                    subscribed_pattern, message
-                ).group(1)
-                chat_df.loc[index, "subscribed_month"] = re.search(
-                    subscribed_pattern, message
-                ).group(2)
-            elif re.search(gifting_pattern, message):  # 贈送訂閱
-                chat_df.loc[index, "comment_type"] = 0
-                chat_df.loc[index, "cheer_type"] = 0
-                chat_df.loc[index, "self_subscribed_type"] = 0
-                chat_df.loc[index, "tier_level"] = re.search(
-                    gifting_pattern, message
-                ).group(2)
-                chat_df.loc[index, "gifting_count"] = re.search(
-                    gifting_pattern, message
-                ).group(1)
-            else:
-                chat_df.loc[index, "comment_type"] = 1
-        except Exception as e:
-            exception_message = f"""re_message(chat_df_index: {index}, chats_file_path: {chat_df['chats_file_path']}). Exception: {e}
-            """
-            write_log(RE_MESSAGE_LOG, exception_message)
-            # chat_df.loc[index, "re_message_error"] = e
-            continue
+    for new_column in [
+        "comment_type",
+        # cheer
+        "cheer_type",
+        "cheer",
+        # subscribe/gifting
+        "self_subscribed_type",
+        "tier_level",
+        "subscribed_month",
+        "gifting_count",
+        # author badge
+        "badge_has_bits_badge",
+        "badge_bits_badge_cheer",
+        "badge_bits_leader",
+        "badge_has_subscription_badge",
+        "badge_subscription_badge_month",
+        "badge_has_sub_gifter_badge",
+        "badge_sub_gifter_badge_version",
+        "badge_sub_gift_leader",
+        "badge_premium_user",
+        "badge_is_vip",
+        "re_message_error",
+    ]:
+        chat_df[new_column] = empty_chat_column(chat_df.index, new_column)
+    chat_df["badge_has_bits_badge"] = chat_df["badge_has_bits_badge"].fillna(False)
+
+    classifier = compile_comment_classifier(
+        kwargs.get("cheer_pattern"),
+        kwargs.get("subscribed_pattern"),
+        kwargs.get("gifting_pattern"),
+    )
+    try:
+        # One regex pass per message; columns are positional capture groups
+        matches = chat_df[column].astype(str).str.extract(classifier.pattern)
+
+        groups = classifier.groups
+        is_cheer = matches[groups["cheer"]].notna()  # 小奇點
+        is_subscribed = matches[groups["subscribed"]].notna()  # 自己訂閱
+        is_gifting = matches[groups["gifting"]].notna()  # 贈送訂閱
+
+        chat_df["comment_type"] = (~(is_cheer | is_subscribed | is_gifting)).astype(
+            CHAT_SCHEMA["comment_type"]
+        )
+        chat_df["cheer_type"] = _masked_column(
+            chat_df.index, "cheer_type", (is_cheer, 1), (is_gifting, 0)
+        )
+        chat_df["cheer"] = _masked_column(
+            chat_df.index, "cheer", (is_cheer, matches[groups["cheer"] + 1])
+        )
+        chat_df["self_subscribed_type"] = _masked_column(
+            chat_df.index, "self_subscribed_type", (is_subscribed, 1), (is_gifting, 0)
+        )
+        chat_df["tier_level"] = _masked_column(
+            chat_df.index,
+            "tier_level",
+            (is_subscribed, matches[groups["subscribed"] + 1]),
+            (is_gifting, matches[groups["gifting"] + 2]),
+        )
+        chat_df["subscribed_month"] = _masked_column(
+            chat_df.index,
+            "subscribed_month",
+            (is_subscribed, matches[groups["subscribed"] + 2]),
+        )
+        chat_df["gifting_count"] = _masked_column(
+            chat_df.index, "gifting_count", (is_gifting, matches[groups["gifting"] + 1])
+        )
+    except Exception as e:
+        exception_message = f"""re_message(chats_file_path: {chat_df.attrs.get('chats_file_path')}). Exception: {e}
+        """
+        write_log(RE_MESSAGE_LOG, exception_message)
     return chat_df
 
 
 def get_emoji_meaning(chat_df, column="raw_message"):
-    chat_df["message"] = None
-    messages = list(chat_df[column].astype(str))
-    for index, message in enumerate(messages):
-        emoji_desc = demoji.findall(message)  # {🔥: fire}
+    # {🔥: fire} substitution and counting happen in the same scan
+    messages, emoji_counts = get_emoji_engine().translate_all(
+        chat_df[column].astype(str)
+    )
+    chat_df["message"] = pd.Series(messages, index=chat_df.index, dtype=object)
+    chat_df["emoji_count"] = pd.Series(
+        emoji_counts, index=chat_df.index, dtype=CHAT_SCHEMA["emoji_count"]
+    )
 
-        emoji_list = [char for char in message if char in emoji_desc]
-        chat_df.loc[index, "emoji_count"] = int(len(emoji_list))
+    return chat_df
 
-        for emoji, emoji_meaning in emoji_desc.items():
-            message = message.replace(emoji, emoji_meaning)
-        chat_df.loc[index, "message"] = message
 
-    return chat_df
+def get_replayable_clip_urls(clip_summary_df: pd.DataFrame) -> dict:
+    """
+    Map clip id -> url for clips that can have a chat replay
+
+    A clip whose VOD is gone has an empty video_id and never has replay,
+    so it is left out before any chat request is made.
+    """
+    video_ids = clip_summary_df["video_id"].astype("string").fillna("").str.strip()
+    replayable = clip_summary_df[video_ids != ""]
+    return dict(zip(replayable["clip_id"], replayable["url"]))
+
+
+def read_clip_ids(file_path: str) -> list:
+    """Clip ids in a clip summary file, reading only that column"""
+    try:
+        return list(pd.read_csv(file_path, usecols=["clip_id"], dtype=str)["clip_id"])
+    except (FileNotFoundError, ValueError, pd.errors.EmptyDataError):
+        return []
 
 
-def process_chat_csv(user_id: str) -> Union[dict, None]:
+def list_chat_clip_ids(chat_directory: str) -> list:
+    """Clip ids of the chat files in a directory
+
+    Partial '.part' downloads are not chat files and get retried.
     """
-    Process chat files for a single user with error handling
+    if not os.path.isdir(chat_directory):
+        return []
+    return [
+        get_chat_file_id(file)
+        for file in os.listdir(chat_directory)
+        if is_chat_file(file) and os.path.isfile(os.path.join(chat_directory, file))
+    ]
+
+
+def list_video_clip_ids(user_id: str, video_directory: str) -> list:
+    """Clip ids of complete videos in a directory
+
+    A file whose download is still marked running or failed in the ledger
+    is partial and is left out.
+    """
+    if not os.path.isdir(video_directory):
+        return []
+    clip_ids = []
+    for file in os.listdir(video_directory):
+        if not file.endswith(".mp4"):
+            continue
+        clip_id = file[: -len(".mp4")]
+        job = job_ledger.get(STAGE_MP4, user_id, clip_id)
+        if job is None or job["status"] == STATUS_DONE:
+            clip_ids.append(clip_id)
+    return clip_ids
+
+
+def get_clip_dates(user_id: str) -> dict:
+    """Map clip id -> creation date (YYYY-MM-DD) from the user's clip summary"""
+    file_path = f"{CLIP_DIRECTORY}/{user_id}.csv"
+    if not os.path.exists(file_path):
+        return {}
+    clips = pd.read_csv(file_path, usecols=["clip_id", "created_at"], dtype=str)
+    return dict(zip(clips["clip_id"], clips["created_at"].str[:10]))
+
+
+def process_chat_file(
+    user_id: str,
+    file: str,
+    output_format: str = CHAT_OUTPUT_FORMAT,
+    clip_date: Optional[str] = None,
+) -> Union[dict, None]:
+    """
+    Enrich and write the chats of a single clip file
+
+    Args:
+        user_id: user id
+        file: chat file name in <CHAT_DIRECTORY>/<user_id>
+        output_format: "parquet" writes to the CHAT_PARQUET_DIRECTORY dataset,
+            "csv" writes <CHAT_CSV_DIRECTORY>/<user_id>/<clip_id>.csv
+        clip_date: clip creation date (YYYY-MM-DD), the Parquet partition
+
+    Returns:
+        Small status dict, or None when the file holds no chats to process
     """
     try:
-        user_chat_dir = os.path.join(CHAT_DIRECTORY, str(user_id))
-        results = []
+        origin_file_path = os.path.join(CHAT_DIRECTORY, str(user_id), file)
+        if not is_chat_file(file):
+            return None
+        clip_id = get_chat_file_id(file)
+        input_checksum = f"{output_format}:{file_checksum(origin_file_path)}"
+        if not job_ledger.should_run(STAGE_CSV, user_id, clip_id, input_checksum):
+            return {"file": file, "status": "skipped"}
+        job_ledger.start(STAGE_CSV, user_id, clip_id, input_checksum)
+
+        clip_chat_df = export_single_user_chats_to_csv(
+            origin_file_path, user_id, write_csv=False
+        )
 
-        for file in os.listdir(user_chat_dir):
-            try:
-                origin_file_path = os.path.join(user_chat_dir, file)
-                clip_chat_df = export_single_user_chats_to_csv(
-                    origin_file_path, user_id
+        if not clip_chat_df:
+            job_ledger.fail(STAGE_CSV, user_id, clip_id, "no chats")
+            return None
+        clip_df = clip_chat_df.get("clip_chat_df")
+        cleaned_clip_path = clip_chat_df.get("cleaned_clip_path")
+
+        with pipeline_metrics.timer("re_message"):
+            chat_df_with_regex = re_message(
+                clip_df,
+                "raw_message",
+                **{
+                    "cheer_pattern": CHEER_PATTERN,
+                    "subscribed_pattern": SUBSCRIBED_PATTERN,
+                    "gifting_pattern": GIFTING_PATTERN,
+                },
+            )
+
+        with pipeline_metrics.timer("get_emoji_meaning"):
+            chat_df_with_emoji_meaning = get_emoji_meaning(
+                chat_df_with_regex, "raw_message"
+            )
+
+        with pipeline_metrics.timer("deal_with_badges"):
+            chat_df_with_badge_info = deal_with_badges(chat_df_with_emoji_meaning)
+        with pipeline_metrics.timer(f"write_chat_{output_format}"):
+            if output_format == "parquet":
+                output_path = write_chat_parquet(
+                    chat_df_with_badge_info,
+                    CHAT_PARQUET_DIRECTORY,
+                    user_id,
+                    clip_id,
+                    clip_date,
                 )
+            else:
+                chat_df_with_badge_info.to_csv(cleaned_clip_path, index=False)
+                output_path = cleaned_clip_path
+        pipeline_metrics.count("process_chat_file", "clips")
+        pipeline_metrics.count(
+            "process_chat_file", "messages", len(chat_df_with_badge_info)
+        )
+        job_ledger.finish(STAGE_CSV, user_id, clip_id, output_path, input_checksum)
+        return {"file": file, "status": "success"}
+    except Exception as e:
+        message = f"Error processing file {file} for user {user_id}: {str(e)}"
+        write_log(PROCESS_CHAT_CSV_LOG, message)
+        pipeline_metrics.error("process_chat_file", e)
+        job_ledger.fail(STAGE_CSV, user_id, get_chat_file_id(file), e)
+        return {
+            "user_id": user_id,
+            "file": file,
+            "status": "error",
+            "error": str(e),
+        }
 
-                if clip_chat_df:
-                    clip_df = clip_chat_df.get("clip_chat_df")
-                    cleaned_clip_path = clip_chat_df.get("cleaned_clip_path")
-
-                    chat_df_with_regex = re_message(
-                        clip_df,
-                        "raw_message",
-                        **{
-                            "cheer_pattern": CHEER_PATTERN,
-                            "subscribed_pattern": SUBSCRIBED_PATTERN,
-                            "gifting_pattern": GIFTING_PATTERN,
-                        },
-                    )
 
-                    chat_df_with_emoji_meaning = get_emoji_meaning(
-                        chat_df_with_regex, "raw_message"
-                    )
+def process_chat_file_in_worker(*args) -> tuple:
+    """process_chat_file for a worker process; its metrics travel back with the result"""
+    return process_chat_file(*args), pipeline_metrics.drain()
 
-                    chat_df_with_badge_info = chat_df_with_emoji_meaning.apply(
-                        deal_with_badge, axis=1
-                    )
-                    chat_df_with_badge_info.to_csv(cleaned_clip_path, index=False)
-                    results.append({"file": file, "status": "success"})
-            except Exception as e:
-                results.append(
-                    {
-                        "user_id": user_id,
-                        "file": file,
-                        "status": "error",
-                        "error": str(e),
-                    }
-                )
-                message = f"Error processing file {file} for user {user_id}: {str(e)}"
-                write_log(PROCESS_CHAT_CSV_LOG, message)
+
+def process_chat_csv(
+    user_id: str, output_format: str = CHAT_OUTPUT_FORMAT
+) -> Union[dict, None]:
+    """
+    Process chat files for a single user with error handling
+
+    Args:
+        user_id: user id
+        output_format: "parquet" or "csv", see process_chat_file
+    """
+    try:
+        user_chat_dir = os.path.join(CHAT_DIRECTORY, str(user_id))
+        results = []
+        clip_dates = get_clip_dates(user_id) if output_format == "parquet" else {}
+
+        for file in os.listdir(user_chat_dir):
+            result = process_chat_file(
+                user_id, file, output_format, clip_dates.get(get_chat_file_id(file))
+            )
+            if result:
+                results.append(result)
         return {"user_id": user_id, "processed_files": results}
     except Exception as e:
         message = f"Error processing user {user_id}: {str(e)}"
@@ -600,51 +1119,110 @@ def process_all_users_parallel(
     return all_results
 
 
-def download_single_video(user_id: str, clip_id: str, output_path: str):
+def process_all_clips_parallel(
+    users_with_chats: list[str],
+    max_workers: Optional[int] = None,
+    output_format: str = CHAT_OUTPUT_FORMAT,
+) -> list[dict]:
+    """
+    Process every user's chat files in parallel using ProcessPoolExecutor
+
+    Work is sharded per clip file instead of per user, so one big streamer
+    is spread over all workers, and the largest files are submitted first
+    to keep stragglers short. Workers only send small status dicts back.
+
+    Args:
+        users_with_chats: List of user IDs to process
+        max_workers: Number of worker processes (defaults to None, which uses os.cpu_count())
+        output_format: "parquet" or "csv", see process_chat_file
+
+    Returns:
+        List of processing results for each user
+    """
+    tasks = []
+    for user_id in users_with_chats:
+        user_chat_dir = os.path.join(CHAT_DIRECTORY, str(user_id))
+        clip_dates = get_clip_dates(user_id) if output_format == "parquet" else {}
+        for file in os.listdir(user_chat_dir):
+            if is_chat_file(file):
+                file_size = os.path.getsize(os.path.join(user_chat_dir, file))
+                clip_date = clip_dates.get(get_chat_file_id(file))
+                tasks.append((file_size, user_id, file, clip_date))
+    tasks.sort(key=lambda task: task[0], reverse=True)
+
+    user_results = {user_id: [] for user_id in users_with_chats}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        future_to_task = {
+            executor.submit(
+                process_chat_file_in_worker, user_id, file, output_format, clip_date
+            ): (user_id, file)
+            for _, user_id, file, clip_date in tasks
+        }
+
+        with tqdm(total=len(future_to_task), desc="Processing chats") as pbar:
+            for future in as_completed(future_to_task):
+                user_id, file = future_to_task[future]
+                try:
+                    result, worker_metrics = future.result()
+                    pipeline_metrics.merge(worker_metrics)
+                except Exception as e:
+                    result = {
+                        "user_id": user_id,
+                        "file": file,
+                        "status": "error",
+                        "error": str(e),
+                    }
+                    write_log(
+                        PROCESS_CHAT_CSV_LOG,
+                        f"Unhandled error processing file {file} for user {user_id}: {str(e)}",
+                    )
+                if result:
+                    user_results[user_id].append(result)
+                pbar.update(1)
+
+    return [
+        {"user_id": user_id, "processed_files": results}
+        for user_id, results in user_results.items()
+    ]
+
+
+def download_single_video(
+    user_id: str,
+    clip_id: str,
+    output_path: str,
+    downloader: Optional[ClipDownloader] = None,
+    expected_duration: Optional[float] = None,
+    on_bytes=None,
+):
     """
     Download a single video and return the result
+    Failures are reported to the event log as "download_mp4_fail" events.
+
+    Args:
+        downloader: ClipDownloader to use, defaults to the shared one
+        expected_duration: clip length in seconds the mp4 must match
+        on_bytes: called with the size of every chunk written
     """
-    file_path = "data/donload_mp4_fail.csv"
-    error_df_columns = ["user_id", "clip_id", "status", "output_path"]
-    error_df = read_or_create_csv_file(file_path, error_df_columns)
+    downloader = downloader or clip_downloader
     try:
-        for quality in ["360", "480", "720", "source"]:
-            result = subprocess.run(
-                [
-                    "twitch-dl",
-                    "download",
-                    clip_id,
-                    "--output",
-                    output_path,
-                    "--quality",
-                    quality,
-                ],
-                capture_output=True,
-                text=True,
+        with pipeline_metrics.timer("download_video"):
+            quality = downloader.download(
+                clip_id,
+                output_path,
+                qualities=VIDEO_QUALITIES,
+                expected_duration=expected_duration,
+                on_bytes=on_bytes,
             )
-
-            if result.returncode == 0:
-                result_dict = {
-                    "user_id": user_id,
-                    "clip_id": clip_id,
-                    "status": "success",
-                    "output_path": output_path,
-                }
-                return result_dict
-            else:
-                result_dict = {
-                    "user_id": user_id,
-                    "clip_id": clip_id,
-                    "status": "error",
-                    "error": result.stderr,
-                    "output_path": output_path,
-                }
-                concat_df_to_file(
-                    [error_df, pd.DataFrame([result_dict])],
-                    file_path,
-                    subset=["clip_id"],
-                )
-                return result_dict
+        pipeline_metrics.count("download_video", "clips")
+        pipeline_metrics.count("download_video", "bytes", os.path.getsize(output_path))
+        result_dict = {
+            "user_id": user_id,
+            "clip_id": clip_id,
+            "status": "success",
+            "quality": quality,
+            "output_path": output_path,
+        }
+        return result_dict
     except Exception as e:
         result_dict = {
             "user_id": user_id,
@@ -653,11 +1231,114 @@ def download_single_video(user_id: str, clip_id: str, output_path: str):
             "error": str(e),
             "output_path": output_path,
         }
+        emit_event("download_mp4_fail", **result_dict)
+        return result_dict
 
-        concat_df_to_file(
-            [error_df, pd.DataFrame([result_dict])], file_path, subset=["clip_id"]
+
+class VideoJob(NamedTuple):
+    user_id: str
+    clip_id: str
+    output_path: str
+    created_at: str = ""
+    view_count: int = 0
+    duration: Optional[float] = None
+
+
+def read_clip_priorities(user_id: str) -> dict:
+    """
+    Map clip id -> (created_at, view_count, duration) from the user's clip
+    summary; duration is None when unknown
+    """
+    file_path = f"{CLIP_DIRECTORY}/{user_id}.csv"
+    try:
+        clips = pd.read_csv(
+            file_path,
+            usecols=lambda column: column
+            in {"clip_id", "created_at", "view_count", "duration"},
+            dtype={"clip_id": str, "created_at": str},
         )
-        return result_dict
+    except (FileNotFoundError, pd.errors.EmptyDataError):
+        return {}
+    created_at = clips.get("created_at", pd.Series("", index=clips.index))
+    view_count = clips.get("view_count", pd.Series(0, index=clips.index))
+    duration = clips.get("duration", pd.Series(np.nan, index=clips.index))
+    duration = duration.astype(object).where(duration.notna(), None)
+    return dict(
+        zip(
+            clips["clip_id"],
+            zip(created_at.fillna(""), view_count.fillna(0).astype(int), duration),
+        )
+    )
+
+
+def get_user_video_jobs(user_id: str) -> tuple[list, list]:
+    """
+    Find the clips of a user whose video still has to be downloaded
+
+    Returns:
+        tuple: (VideoJobs to run, "skipped" results for videos already stored)
+    """
+    user_mp4_directory_path = f"{MP4_DIRECTORY}/{user_id}"
+    os.makedirs(user_mp4_directory_path, exist_ok=True)
+    user_chat_dir = os.path.join(CHAT_DIRECTORY, str(user_id))
+    chat_clip_ids = clip_index.members(
+        STAGE_CHATS, user_id, seed=lambda: list_chat_clip_ids(user_chat_dir)
+    )
+    video_clip_ids = clip_index.members(
+        STAGE_MP4,
+        user_id,
+        seed=lambda: list_video_clip_ids(user_id, user_mp4_directory_path),
+    )
+    priorities = read_clip_priorities(user_id)
+
+    jobs = []
+    skipped = []
+    for clip_id in sorted(chat_clip_ids):
+        output_path = f"{user_mp4_directory_path}/{clip_id}.mp4"
+        # Skip if already downloaded
+        if clip_id in video_clip_ids:
+            skipped.append(
+                {
+                    "user_id": user_id,
+                    "clip_id": clip_id,
+                    "status": "skipped",
+                    "message": "File already exists",
+                    "output_path": output_path,
+                }
+            )
+            continue
+        created_at, view_count, duration = priorities.get(clip_id, ("", 0, None))
+        jobs.append(
+            VideoJob(user_id, clip_id, output_path, created_at, view_count, duration)
+        )
+    return jobs, skipped
+
+
+def run_video_job(
+    job: VideoJob, downloader: Optional[ClipDownloader] = None, on_bytes=None
+) -> dict:
+    """Download one clip's video and record the outcome"""
+    job_ledger.start(STAGE_MP4, job.user_id, job.clip_id)
+    result = download_single_video(
+        job.user_id,
+        job.clip_id,
+        job.output_path,
+        downloader=downloader,
+        expected_duration=job.duration,
+        on_bytes=on_bytes,
+    )
+    if result["status"] == "success":
+        job_ledger.finish(STAGE_MP4, job.user_id, job.clip_id, job.output_path)
+        clip_index.add(STAGE_MP4, job.user_id, [job.clip_id])
+    else:
+        job_ledger.fail(STAGE_MP4, job.user_id, job.clip_id, result.get("error"))
+    return result
+
+
+def schedule_video_jobs(jobs: list, priority: str = VIDEO_PRIORITY) -> list:
+    """Order jobs for the global download queue, e.g. newest clips first"""
+    column, descending = VIDEO_PRIORITIES[priority]
+    return sorted(jobs, key=lambda job: getattr(job, column), reverse=descending)
 
 
 def download_user_videos(user_id: str):
@@ -665,88 +1346,305 @@ def download_user_videos(user_id: str):
     Download all videos for a single user
     """
     try:
-        user_mp4_directory_path = f"{MP4_DIRECTORY}/{user_id}"
-        os.makedirs(user_mp4_directory_path, exist_ok=True)
-        user_chat_dir = os.path.join(CHAT_DIRECTORY, str(user_id))
-
-        results = []
-
-        for file in os.listdir(user_chat_dir):
-            if file.endswith(".json"):
-                clip_id = file.split(".")[0]
-                output_path = f"{user_mp4_directory_path}/{clip_id}.mp4"
-                # Skip if file already exists
-                if os.path.exists(output_path):
-                    results.append(
-                        {
-                            "user_id": user_id,
-                            "clip_id": clip_id,
-                            "status": "skipped",
-                            "message": "File already exists",
-                            "output_path": output_path,
-                        }
-                    )
-                    continue
-                # Run the subprocess to download the clip to the specified path
-                result = download_single_video(user_id, clip_id, output_path)
-                results.append(result)
+        jobs, results = get_user_video_jobs(user_id)
+        for job in jobs:
+            results.append(run_video_job(job))
         return {"user_id": user_id, "status": "completed", "results": results}
     except Exception as e:
         return {"user_id": user_id, "status": "error", "error": str(e)}
 
 
-def download_all_videos_parallel(users_with_chats: list[str], max_workers: int = 4):
+def download_all_videos_parallel(
+    users_with_chats: list[str],
+    max_workers: int = VIDEO_DOWNLOAD_WORKERS,
+    priority: str = VIDEO_PRIORITY,
+    max_bandwidth: Optional[int] = None,
+):
     """
-    Download videos for all users in parallel using ThreadPoolExecutor
+    Download videos for all users from one global clip queue
+
+    Every pending clip of every user goes into a single queue ordered by
+    `priority`, so a user with thousands of clips no longer holds one
+    worker while the others sit idle.
 
     Args:
         users_with_chats: List of user IDs to process
-        max_workers: Maximum number of threads to use (default: 4)
+        max_workers: Number of clips downloaded at once
+        priority: Key of VIDEO_PRIORITIES, e.g. "newest" or "most_viewed"
+        max_bandwidth: Total download speed cap in bytes per second, shared
+            by all workers
 
     Returns:
         List of download results for each user
     """
-    all_results = []
-    total_users = len(users_with_chats)
+    user_results = {}
+    jobs = []
+    for user_id in users_with_chats:
+        try:
+            user_jobs, skipped = get_user_video_jobs(user_id)
+        except Exception as e:
+            error_msg = f"Unhandled error processing user {user_id}: {str(e)}"
+            print(error_msg)
+            write_log(DOWNLOAD_MP4_LOG, error_msg)
+            user_results[user_id] = {
+                "user_id": user_id,
+                "status": "error",
+                "error": str(e),
+            }
+            continue
+        user_results[user_id] = {
+            "user_id": user_id,
+            "status": "completed",
+            "results": skipped,
+        }
+        jobs.extend(user_jobs)
+
+    jobs = schedule_video_jobs(jobs, priority)
+    downloader = ClipDownloader(
+        pool_size=max_workers,
+        bandwidth=(
+            None if max_bandwidth is None else RateLimiter(max_bandwidth, period=1.0)
+        ),
+    )
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Create a dictionary mapping futures to user_ids
-        future_to_user = {
-            executor.submit(download_user_videos, user_id): user_id
-            for user_id in users_with_chats
+    with tqdm(total=len(jobs), desc="Downloading clips") as clip_bar, tqdm(
+        desc="Downloaded", unit="B", unit_scale=True, unit_divisor=1024
+    ) as byte_bar, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # The executor's FIFO work queue is the global priority queue
+        future_to_job = {
+            executor.submit(run_video_job, job, downloader, byte_bar.update): job
+            for job in jobs
         }
+        for future in as_completed(future_to_job):
+            job = future_to_job[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                error_msg = f"Unhandled error downloading clip {job.clip_id}: {e}"
+                write_log(DOWNLOAD_MP4_LOG, error_msg)
+                result = {
+                    "user_id": job.user_id,
+                    "clip_id": job.clip_id,
+                    "status": "error",
+                    "error": str(e),
+                    "output_path": job.output_path,
+                }
+            user_results[job.user_id]["results"].append(result)
+            clip_bar.update(1)
+
+    for user_id, result in user_results.items():
+        # Log the result
+        if result["status"] == "completed":
+            success_count = sum(
+                1 for r in result["results"] if r["status"] == "success"
+            )
+            total_count = len(result["results"])
+            print(
+                f"User {user_id}: Successfully downloaded {success_count}/{total_count} videos"
+            )
+        else:
+            print(f"User {user_id}: Error - {result.get('error', 'Unknown error')}")
+    return list(user_results.values())
 
-        # Use tqdm for progress bar
-        with tqdm(total=total_users, desc="Processing users") as pbar:
-            for future in as_completed(future_to_user):
-                user_id = future_to_user[future]
-                try:
-                    result = future.result()
-                    all_results.append(result)
 
-                    # Log the result
-                    if result["status"] == "completed":
-                        success_count = sum(
-                            1 for r in result["results"] if r["status"] == "success"
-                        )
-                        total_count = len(result["results"])
-                        print(
-                            f"User {user_id}: Successfully downloaded {success_count}/{total_count} videos"
-                        )
-                    else:
-                        print(
-                            f"User {user_id}: Error - {result.get('error', 'Unknown error')}"
-                        )
+class _BoundedPool:
+    """
+    Executor wrapper that blocks submit() while max_pending tasks are unfinished
+
+    Producers feeding it slow down to the pace of its workers, so the
+    backlog between two pipeline stages never grows past max_pending.
+    """
+
+    def __init__(self, executor, max_pending: int, on_result: Callable):
+        self.executor = executor
+        self.on_result = on_result
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def submit(self, key, function, *args):
+        self._slots.acquire()
+        try:
+            future = self.executor.submit(function, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda future: self._done(key, future))
+
+    def _done(self, key, future):
+        self._slots.release()
+        self.on_result(key, future)
+
+
+def run_streaming_pipeline(
+    user_ids: list,
+    twitch: Twitch,
+    chat_download: ChatDownload,
+    output_format: str = CHAT_OUTPUT_FORMAT,
+    process_workers: Optional[int] = None,
+    video_workers: int = VIDEO_DOWNLOAD_WORKERS,
+    max_bandwidth: Optional[int] = None,
+    download_videos: bool = True,
+    user_queue_size: int = STREAM_USER_QUEUE_SIZE,
+    max_pending_clips: int = STREAM_MAX_PENDING_CLIPS,
+) -> dict:
+    """
+    Fetch, download, process and download videos with all stages overlapped
+
+    A producer thread fetches each user's clip list into a bounded queue.
+    The main thread downloads chats from it, and every chat file is handed
+    to the processing ProcessPool, and its clip to the video ThreadPool,
+    as soon as it is on disk. Both hand-offs block once max_pending_clips
+    clips are waiting, which slows the chat downloads down and, through
+    the full user queue, the clip fetching, so memory stays bounded while
+    the run takes about as long as its slowest stage.
+
+    Chat files stored by an earlier run are handed over after the user's
+    downloads, also for users without new clips or whose fetch failed, so
+    failed processing and missing videos are retried; process_chat_file
+    and the clip index skip finished work.
+    Videos are downloaded in arrival order instead of by VIDEO_PRIORITY.
+
+    Returns:
+        dict: "processed_files" and "videos" result lists, and "errors"
+            for users whose clips could not be fetched
+    """
+    results = {"processed_files": [], "videos": [], "errors": []}
+    results_lock = threading.Lock()
+    user_queue = queue.Queue(maxsize=user_queue_size)
+    done = object()
 
+    def fetch_clips():
+        try:
+            for user_id in user_ids:
+                user_id = str(user_id)
+                try:
+                    clip_summary_df = twitch.summary_user_clips_to_csv(user_id)
                 except Exception as e:
-                    error_msg = f"Unhandled error processing user {user_id}: {str(e)}"
-                    print(error_msg)
-                    all_results.append(
-                        {"user_id": user_id, "status": "error", "error": str(e)}
-                    )
-                    write_log(DOWNLOAD_MP4_LOG, error_msg)
+                    write_log(FETCH_CLIPS_LOG, f"{user_id}: {e}")
+                    with results_lock:
+                        results["errors"].append(
+                            {"user_id": user_id, "status": "error", "error": str(e)}
+                        )
+                    clip_summary_df = pd.DataFrame()
+                # Queued even without new clips, so stored chats are retried
+                user_queue.put((user_id, clip_summary_df))
+        finally:
+            user_queue.put(done)
+
+    def on_processed(key, future):
+        user_id, file = key
+        try:
+            result, worker_metrics = future.result()
+            pipeline_metrics.merge(worker_metrics)
+        except Exception as e:
+            write_log(
+                PROCESS_CHAT_CSV_LOG,
+                f"Unhandled error processing file {file} for user {user_id}: {e}",
+            )
+            result = {
+                "user_id": user_id,
+                "file": file,
+                "status": "error",
+                "error": str(e),
+            }
+        if result:
+            with results_lock:
+                results["processed_files"].append(result)
 
-                pbar.update(1)
+    def on_video(job, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            write_log(
+                DOWNLOAD_MP4_LOG, f"Unhandled error downloading clip {job.clip_id}: {e}"
+            )
+            result = {
+                "user_id": job.user_id,
+                "clip_id": job.clip_id,
+                "status": "error",
+                "error": str(e),
+                "output_path": job.output_path,
+            }
+        with results_lock:
+            results["videos"].append(result)
+
+    downloader = ClipDownloader(
+        pool_size=video_workers,
+        bandwidth=(
+            None if max_bandwidth is None else RateLimiter(max_bandwidth, period=1.0)
+        ),
+    )
+    producer = threading.Thread(target=fetch_clips, name="clip-fetcher", daemon=True)
+    with ProcessPoolExecutor(
+        max_workers=process_workers
+    ) as process_executor, ThreadPoolExecutor(
+        max_workers=video_workers
+    ) as video_executor:
+        # Fork the workers now, before the download threads exist
+        process_executor.submit(os.getpid).result()
+        processing = _BoundedPool(process_executor, max_pending_clips, on_processed)
+        videos = _BoundedPool(video_executor, max_pending_clips, on_video)
+        producer.start()
+        while (item := user_queue.get()) is not done:
+            user_id, clip_summary_df = item
+            clip_dates = get_clip_dates(user_id) if output_format == "parquet" else {}
+            priorities = read_clip_priorities(user_id) if download_videos else {}
+            mp4_directory = f"{MP4_DIRECTORY}/{user_id}"
+            os.makedirs(mp4_directory, exist_ok=True)
+            stored_video_ids = (
+                clip_index.members(
+                    STAGE_MP4,
+                    user_id,
+                    seed=lambda: list_video_clip_ids(user_id, mp4_directory),
+                )
+                if download_videos
+                else set()
+            )
+            handed_over = set()
+            handed_over_lock = threading.Lock()
+
+            def hand_over(clip_id, chat_path, user_id=user_id):
+                with handed_over_lock:
+                    if clip_id in handed_over:
+                        return
+                    handed_over.add(clip_id)
+                file = os.path.basename(chat_path)
+                processing.submit(
+                    (user_id, file),
+                    process_chat_file_in_worker,
+                    user_id,
+                    file,
+                    output_format,
+                    clip_dates.get(clip_id),
+                )
+                if download_videos and clip_id not in stored_video_ids:
+                    created_at, view_count, duration = priorities.get(
+                        clip_id, ("", 0, None)
+                    )
+                    job = VideoJob(
+                        user_id,
+                        clip_id,
+                        f"{mp4_directory}/{clip_id}.mp4",
+                        created_at,
+                        view_count,
+                        duration,
+                    )
+                    videos.submit(job, run_video_job, job, downloader)
+
+            chat_directory = f"{CHAT_DIRECTORY}/{user_id}"
+            if not clip_summary_df.empty:
+                chat_download.download_and_save_chats_from_clips(
+                    user_id,
+                    chat_directory,
+                    get_replayable_clip_urls(clip_summary_df),
+                    on_chats=hand_over,
+                )
+            # Chats stored by earlier runs
+            if os.path.isdir(chat_directory):
+                for file in os.listdir(chat_directory):
+                    if is_chat_file(file):
+                        hand_over(get_chat_file_id(file), file)
+        producer.join()
+    return results
 
 
 if __name__ == "__main__":
@@ -761,12 +1659,8 @@ if __name__ == "__main__":
         file.write(f"started_at: {twitch.started_at}\n")
         file.write(f"ended_at: {twitch.ended_at}\n\n")
 
-    user_info_list = []
-    user_info = twitch.get_users_by_login_names(streamer_names)
-    user_info_list.extend(user_info.get("data", []))
-    user_info_df = read_or_create_csv_file(USERS_INFO_FILE)
-    if "twitch_user_id" not in user_info_df.columns:
-        user_info_df = create_users_info_file(user_info_list, USERS_INFO_FILE)
+    user_info_df = twitch.get_users_info(streamer_names)
+    user_info_df.to_csv(USERS_INFO_FILE, index=False)
 
     # # User without clip record
     user_without_clip_file = f"{CLIP_DIRECTORY}/user_without_clip.csv"
@@ -774,27 +1668,35 @@ if __name__ == "__main__":
         user_without_clip_file, columns=["user_id"]
     ).astype(str)
 
-    for user_id in user_info_df["twitch_user_id"]:
-        user_id = str(user_id)
-        follower_count = twitch.get_user_follower_count(user_id)
-        user_info_df.loc[
-            user_info_df["twitch_user_id"] == user_id, "follower_count"
-        ] = follower_count
-        clip_summary_df = twitch.summary_user_clips_to_csv(user_id)
-        if clip_summary_df.empty:
-            continue
-
-        clip_urls = dict(
-            zip(list(clip_summary_df["clip_id"]), list(clip_summary_df["url"]))
-        )
-        chat_downloader.download_and_save_chats_from_clips(
-            user_id, f"{CHAT_DIRECTORY}/{user_id}", clip_urls
+    if PIPELINE_MODE == "streaming":
+        run_streaming_pipeline(
+            [str(user_id) for user_id in user_info_df["twitch_user_id"]],
+            twitch,
+            chat_downloader,
         )
+    else:
+        for user_id in user_info_df["twitch_user_id"]:
+            user_id = str(user_id)
+            clip_summary_df = twitch.summary_user_clips_to_csv(user_id)
+            if clip_summary_df.empty:
+                continue
+
+            clip_urls = get_replayable_clip_urls(clip_summary_df)
+            chat_downloader.download_and_save_chats_from_clips(
+                user_id, f"{CHAT_DIRECTORY}/{user_id}", clip_urls
+            )
 
-    user_info_df["follower_count"] = user_info_df["follower_count"].apply(
-        lambda x: int(x) if pd.notnull(x) else 0
+        users_with_chats = get_items_in_dir(CHAT_DIRECTORY)
+        download_all_videos_parallel(users_with_chats)
+        process_all_clips_parallel(users_with_chats=users_with_chats)
+    export_event_views()
+    print(job_ledger.completeness().to_string(index=False))
+    # Slowest stage first
+    stage_summary = pipeline_metrics.export(
+        f"{METRICS_DIRECTORY}/{datetime.today().strftime('%Y-%m-%d')}"
+    )
+    print(
+        pd.DataFrame.from_dict(stage_summary, orient="index")[
+            ["count", "seconds", "p50", "p95", "max"]
+        ].to_string()
     )
-    user_info_df.to_csv(USERS_INFO_FILE, index=False)
-    users_with_chats = get_items_in_dir(CHAT_DIRECTORY)
-    download_all_videos_parallel(users_with_chats)
-    process_all_users_parallel(users_with_chats=users_with_chats, max_workers=10)
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+# Shared in-memory dtypes of a chat table. Repeated ids and badge values are
+# categoricals, derived flags and counts are nullable ints/booleans;
+# raw_message, message and message_id stay plain strings. Cheer and gift
+# counts come straight from chat text, so they get the full Int64 range.
+CHAT_SCHEMA = {
+    "author_id": "category",
+    "time_text": "category",
+    "time_in_seconds": "float64",
+    "clip_id": "category",
+    "comment_type": "Int8",
+    "cheer_type": "Int8",
+    "cheer": "Int64",
+    "self_subscribed_type": "Int8",
+    "tier_level": "Int16",
+    "subscribed_month": "category",
+    "gifting_count": "Int64",
+    "badge_has_bits_badge": "boolean",
+    "badge_bits_badge_cheer": "category",
+    "badge_bits_leader": "category",
+    "badge_has_subscription_badge": "boolean",
+    "badge_subscription_badge_month": "Int16",
+    "badge_has_sub_gifter_badge": "boolean",
+    "badge_sub_gifter_badge_version": "category",
+    "badge_sub_gift_leader": "category",
+    "badge_premium_user": "category",
+    "badge_is_vip": "boolean",
+    "re_message_error": "category",
+    "emoji_count": "Int32",
+}
+
+
+def empty_chat_column(index, column: str) -> pd.Series:
+    """All-missing column with the schema dtype of `column`"""
+    return pd.Series(pd.NA, index=index, dtype=CHAT_SCHEMA.get(column, object))
+
+
+def _to_dtype(values: pd.Series, dtype: str) -> pd.Series:
+    if values.dtype == dtype:
+        return values
+    if dtype in ("Int8", "Int16", "Int32", "Int64"):
+        # Out-of-range numbers, e.g. "Cheer99999999999", become missing
+        numbers = pd.to_numeric(values, errors="coerce")
+        bounds = np.iinfo(dtype.lower())
+        return numbers.where(numbers.between(bounds.min, bounds.max)).astype(dtype)
+    if dtype == "float64":
+        return pd.to_numeric(values, errors="coerce").astype(dtype)
+    if dtype == "boolean":
+        return values.map(
+            lambda value: pd.NA if pd.isna(value) else value in (True, "True", "true")
+        ).astype(dtype)
+    if dtype == "category":
+        return values.astype(object).where(values.notna(), None).astype(dtype)
+    return values.astype(dtype)
+
+
+def apply_chat_schema(chat_df: pd.DataFrame) -> pd.DataFrame:
+    """Convert the schema columns present in chat_df in place, and return it"""
+    for column, dtype in CHAT_SCHEMA.items():
+        if column in chat_df:
+            chat_df[column] = _to_dtype(chat_df[column], dtype)
+    return chat_df
+
+
+class BadgeListInterner:
+    """
+    Share one list object between messages with the same badges
+
+    Most messages of a clip carry one of a handful of badge combinations,
+    so this keeps a few lists alive instead of one per message. The
+    shared lists must not be modified.
+    """
+
+    def __init__(self):
+        self._lists = {}
+
+    def __call__(self, badges: list) -> list:
+        return self._lists.setdefault(tuple(map(repr, badges)), badges)
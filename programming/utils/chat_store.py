@@ -0,0 +1,210 @@
+import os
+import re
+import pandas as pd
+from utils.chat_schema import apply_chat_schema
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:  # Parquet output is optional, CSV needs nothing extra
+    pa = None
+    ds = None
+
+PARTITION_COLUMNS = ["broadcaster_id", "clip_date"]
+
+# column -> Arrow type name; "dictionary" is a dictionary-encoded string
+CHAT_PARQUET_COLUMNS = {
+    "author_id": "dictionary",
+    "badges_list": "list",
+    "raw_message": "string",
+    "message_id": "string",
+    "time_text": "string",
+    "time_in_seconds": "float64",
+    "clip_id": "dictionary",
+    "comment_type": "int8",
+    "cheer_type": "int8",
+    "cheer": "int64",
+    "self_subscribed_type": "int8",
+    "tier_level": "int16",
+    "subscribed_month": "string",
+    "gifting_count": "int64",
+    "badge_has_bits_badge": "bool_",
+    "badge_bits_badge_cheer": "dictionary",
+    "badge_bits_leader": "dictionary",
+    "badge_has_subscription_badge": "bool_",
+    "badge_subscription_badge_month": "int16",
+    "badge_has_sub_gifter_badge": "bool_",
+    "badge_sub_gifter_badge_version": "dictionary",
+    "badge_sub_gift_leader": "dictionary",
+    "badge_premium_user": "dictionary",
+    "badge_is_vip": "bool_",
+    "re_message_error": "string",
+    "message": "string",
+    "emoji_count": "int32",
+    "broadcaster_id": "string",
+    "clip_date": "string",
+}
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for the Parquet chat dataset")
+
+
+def _arrow_type(type_name: str):
+    if type_name == "dictionary":
+        return pa.dictionary(pa.int32(), pa.string())
+    if type_name == "list":
+        return pa.list_(pa.string())
+    return getattr(pa, type_name)()
+
+
+def get_chat_parquet_schema():
+    """Fixed schema of the enriched chat dataset"""
+    _require_pyarrow()
+    return pa.schema(
+        [
+            pa.field(column, _arrow_type(type_name))
+            for column, type_name in CHAT_PARQUET_COLUMNS.items()
+        ]
+    )
+
+
+def _to_arrow_column(values: pd.Series, type_name: str):
+    arrow_type = _arrow_type(type_name)
+    if type_name.startswith("int") or type_name == "float64":
+        values = pd.to_numeric(values, errors="coerce")
+        return pa.array(values, type=arrow_type, from_pandas=True)
+    if type_name == "bool_":
+        values = values.map(lambda value: None if pd.isna(value) else bool(value))
+        return pa.array(values, type=arrow_type, from_pandas=True)
+    if type_name == "list":
+        values = values.map(
+            lambda badges: [badge for badge in badges if isinstance(badge, str)]
+        )
+        return pa.array(values, type=arrow_type)
+    values = values.map(lambda value: None if pd.isna(value) else str(value))
+    if type_name == "dictionary":
+        return pa.array(values, type=pa.string()).dictionary_encode()
+    return pa.array(values, type=arrow_type)
+
+
+def chat_df_to_table(chat_df: pd.DataFrame):
+    """Convert an enriched chat DataFrame to the fixed Arrow schema
+
+    Columns missing from chat_df become all-null columns; extra columns
+    are dropped.
+    """
+    schema = get_chat_parquet_schema()
+    arrays = []
+    for column, type_name in CHAT_PARQUET_COLUMNS.items():
+        if column in chat_df:
+            arrays.append(_to_arrow_column(chat_df[column], type_name))
+        else:
+            arrays.append(pa.nulls(len(chat_df), type=_arrow_type(type_name)))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _clip_files(broadcaster_dir: str, clip_id: str) -> list:
+    """Parquet files of one clip in any clip_date partition of a broadcaster"""
+    if not os.path.isdir(broadcaster_dir):
+        return []
+    clip_file = re.compile(rf"{re.escape(clip_id)}-\d+\.parquet")
+    return [
+        entry.path
+        for partition in os.scandir(broadcaster_dir)
+        if partition.is_dir()
+        for entry in os.scandir(partition.path)
+        if clip_file.fullmatch(entry.name)
+    ]
+
+
+def write_chat_parquet(
+    chat_df: pd.DataFrame,
+    dataset_dir: str,
+    broadcaster_id: str,
+    clip_id: str,
+    clip_date: str = None,
+):
+    """
+    Write one clip's enriched chats into the partitioned dataset
+
+    Files land in '<dataset_dir>/broadcaster_id=<id>/clip_date=<YYYY-MM-DD>/'
+    and are named after the clip. Reprocessing a clip replaces its file;
+    once the new one is written, files of the clip left in other clip_date
+    partitions (e.g. written before its date was known) are removed.
+
+    Returns:
+        str: path of the written Parquet file
+    """
+    _require_pyarrow()
+    chat_df = chat_df.assign(broadcaster_id=str(broadcaster_id), clip_date=clip_date)
+    table = chat_df_to_table(chat_df)
+    written_files = []
+    ds.write_dataset(
+        table,
+        dataset_dir,
+        format="parquet",
+        partitioning=ds.partitioning(
+            pa.schema([table.schema.field(name) for name in PARTITION_COLUMNS]),
+            flavor="hive",
+        ),
+        basename_template=f"{clip_id}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+        file_visitor=lambda written_file: written_files.append(written_file.path),
+    )
+    written = {os.path.normpath(file_path) for file_path in written_files}
+    broadcaster_dir = os.path.join(dataset_dir, f"broadcaster_id={broadcaster_id}")
+    for file_path in _clip_files(broadcaster_dir, str(clip_id)):
+        if os.path.normpath(file_path) not in written:
+            os.remove(file_path)
+    return written_files[0] if written_files else None
+
+
+def read_chat_parquet(
+    dataset_dir: str,
+    columns: list = None,
+    broadcaster_ids: list = None,
+    started_at: str = None,
+    ended_at: str = None,
+) -> pd.DataFrame:
+    """
+    Read chats from the dataset, pruning partitions before any file is opened
+
+    Args:
+        columns (list, optional): columns to load, defaults to all
+        broadcaster_ids (list, optional): only these broadcasters
+        started_at (str, optional): first clip date, e.g. "2025-05-01"
+        ended_at (str, optional): clip dates before this one
+    """
+    _require_pyarrow()
+    if not os.path.exists(dataset_dir):
+        return pd.DataFrame(columns=columns or list(CHAT_PARQUET_COLUMNS))
+    dataset = ds.dataset(
+        dataset_dir,
+        schema=get_chat_parquet_schema(),
+        format="parquet",
+        partitioning=ds.partitioning(
+            pa.schema(
+                [
+                    pa.field(name, _arrow_type(CHAT_PARQUET_COLUMNS[name]))
+                    for name in PARTITION_COLUMNS
+                ]
+            ),
+            flavor="hive",
+        ),
+    )
+    condition = None
+    if broadcaster_ids is not None:
+        condition = ds.field("broadcaster_id").isin(
+            [str(broadcaster_id) for broadcaster_id in broadcaster_ids]
+        )
+    if started_at:
+        start = ds.field("clip_date") >= started_at
+        condition = start if condition is None else condition & start
+    if ended_at:
+        end = ds.field("clip_date") < ended_at
+        condition = end if condition is None else condition & end
+    return apply_chat_schema(
+        dataset.to_table(columns=columns, filter=condition).to_pandas()
+    )
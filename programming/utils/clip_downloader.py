@@ -0,0 +1,232 @@
+import os
+import struct
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Callable, Optional
+from urllib.parse import urlencode
+from utils.helix import RateLimiter
+
+GQL_URL = "https://gql.twitch.tv/gql"
+# Public client id of the Twitch web player, used for clip access tokens
+GQL_CLIENT_ID = "kimne78kx3ncx6brgo4mv6wki5h1ko"
+CLIP_ACCESS_TOKEN_QUERY_HASH = (
+    "36b89d2507fce29e5ca551df756d27c1cfe079e2609642b4390aa4c35796eb11"
+)
+DEFAULT_QUALITIES = ["360", "480", "720", "source"]
+PARTIAL_FILE_SUFFIX = ".part"
+# Allowed gap between the mp4's duration and the clip's Helix duration
+DURATION_TOLERANCE = 1.0
+
+
+class ClipDownloadError(Exception):
+    pass
+
+
+def _find_box(f, box_type: bytes, start: int, end: int) -> Optional[tuple]:
+    """Find a child box between start and end; returns (payload start, box end)"""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, kind = struct.unpack(">I4s", f.read(8))
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            return None
+        if kind == box_type:
+            return offset + header_size, offset + size
+        offset += size
+    return None
+
+
+def read_mp4_duration(file_path: str) -> Optional[float]:
+    """Duration in seconds from the mp4's moov/mvhd box, None if unreadable"""
+    try:
+        with open(file_path, "rb") as f:
+            end = os.fstat(f.fileno()).st_size
+            moov = _find_box(f, b"moov", 0, end)
+            mvhd = moov and _find_box(f, b"mvhd", *moov)
+            if not mvhd:
+                return None
+            f.seek(mvhd[0])
+            version = f.read(4)[0]
+            if version == 1:
+                f.seek(16, os.SEEK_CUR)
+                timescale, duration = struct.unpack(">IQ", f.read(12))
+            else:
+                f.seek(8, os.SEEK_CUR)
+                timescale, duration = struct.unpack(">II", f.read(8))
+    except (OSError, struct.error, IndexError):
+        return None
+    return duration / timescale if timescale else None
+
+
+class ClipDownloader:
+    """
+    In-process clip video downloader
+
+    Resolves a clip's signed quality URLs with one GQL call, streams the
+    chosen quality over a pooled session into '<output>.<quality>.part',
+    resumes an interrupted transfer with an HTTP Range request, verifies
+    the byte count and mp4 duration, then renames the file into place.
+    An optional RateLimiter in bytes per second caps the total bandwidth
+    of every download sharing it.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 16,
+        chunk_size: int = 1 << 20,
+        max_retries: int = 5,
+        timeout: float = 30.0,
+        bandwidth: Optional[RateLimiter] = None,
+    ):
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.bandwidth = bandwidth
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def resolve_qualities(self, clip_id: str) -> dict:
+        """
+        Signed download URL of every quality of a clip
+
+        Returns:
+            dict: quality -> url, highest quality first, plus "source"
+                for the highest one
+        """
+        response = self.session.post(
+            GQL_URL,
+            headers={"Client-ID": GQL_CLIENT_ID},
+            json={
+                "operationName": "VideoAccessToken_Clip",
+                "variables": {"slug": clip_id},
+                "extensions": {
+                    "persistedQuery": {
+                        "version": 1,
+                        "sha256Hash": CLIP_ACCESS_TOKEN_QUERY_HASH,
+                    }
+                },
+            },
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        clip = (response.json().get("data") or {}).get("clip")
+        if not clip or not clip.get("videoQualities"):
+            raise ClipDownloadError(f"Clip {clip_id} has no downloadable video")
+        token = clip["playbackAccessToken"]
+        query = urlencode({"sig": token["signature"], "token": token["value"]})
+        qualities = {
+            quality["quality"]: f"{quality['sourceURL']}?{query}"
+            for quality in sorted(
+                clip["videoQualities"],
+                key=lambda quality: int(quality["quality"]),
+                reverse=True,
+            )
+        }
+        qualities["source"] = next(iter(qualities.values()))
+        return qualities
+
+    def _stream(self, url: str, part_path: str, on_bytes=None) -> int:
+        """Append the rest of url to part_path; returns the expected total size"""
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else None
+        with self.session.get(
+            url, headers=headers, stream=True, timeout=self.timeout
+        ) as response:
+            if response.status_code == 416:
+                # The part file does not match the remote one; start over
+                os.remove(part_path)
+                return self._stream(url, part_path, on_bytes)
+            response.raise_for_status()
+            if response.status_code == 206:
+                total = int(response.headers["Content-Range"].rsplit("/", 1)[1])
+                mode = "ab"
+            else:
+                total = int(response.headers.get("Content-Length", -1))
+                mode = "wb"
+            with open(part_path, mode) as part_file:
+                for chunk in response.iter_content(self.chunk_size):
+                    if self.bandwidth is not None:
+                        self.bandwidth.acquire(len(chunk))
+                    part_file.write(chunk)
+                    if on_bytes is not None:
+                        on_bytes(len(chunk))
+        return total
+
+    def _fetch(self, url: str, part_path: str, on_bytes=None) -> int:
+        """Stream url into part_path, resuming after connection failures"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._stream(url, part_path, on_bytes)
+            except (
+                requests.ConnectionError,
+                requests.Timeout,
+                requests.exceptions.ChunkedEncodingError,
+            ):
+                if attempt == self.max_retries:
+                    raise
+
+    def verify(
+        self, part_path: str, total: int, expected_duration: Optional[float] = None
+    ):
+        size = os.path.getsize(part_path)
+        if total >= 0 and size != total:
+            raise ClipDownloadError(f"Expected {total} bytes, got {size}")
+        duration = read_mp4_duration(part_path)
+        if duration is None:
+            raise ClipDownloadError("Not a readable mp4 file")
+        if (
+            expected_duration is not None
+            and abs(duration - expected_duration) > DURATION_TOLERANCE
+        ):
+            raise ClipDownloadError(
+                f"Expected {expected_duration:.1f}s of video, got {duration:.1f}s"
+            )
+
+    def download(
+        self,
+        clip_id: str,
+        output_path: str,
+        qualities: list = DEFAULT_QUALITIES,
+        expected_duration: Optional[float] = None,
+        on_bytes: Optional[Callable[[int], None]] = None,
+    ) -> str:
+        """
+        Download a clip, trying each quality in turn
+
+        Args:
+            qualities (list): preferred qualities, e.g. ["360", "source"]
+            expected_duration (float, optional): clip length from Helix,
+                checked against the mp4's own duration
+            on_bytes (callable, optional): called with each chunk's size
+
+        Returns:
+            str: the quality that was downloaded
+        """
+        available = self.resolve_qualities(clip_id)
+        errors = []
+        for quality in qualities:
+            url = available.get(quality)
+            if url is None:
+                continue
+            part_path = f"{output_path}.{quality}{PARTIAL_FILE_SUFFIX}"
+            try:
+                total = self._fetch(url, part_path, on_bytes)
+                self.verify(part_path, total, expected_duration)
+            except (requests.RequestException, ClipDownloadError) as e:
+                errors.append(f"{quality}: {e}")
+                if isinstance(e, ClipDownloadError) and os.path.exists(part_path):
+                    os.remove(part_path)
+                continue
+            os.replace(part_path, output_path)
+            return quality
+        if not errors:
+            errors.append(f"none of {qualities} in {list(available)}")
+        raise ClipDownloadError("; ".join(errors))
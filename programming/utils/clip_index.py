@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+
+CLIP_INDEX_FILE = "data/clip_index.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS clips (
+    stage TEXT NOT NULL,
+    clip_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    added_at TEXT NOT NULL,
+    PRIMARY KEY (stage, clip_id)
+) WITHOUT ROWID
+"""
+_SEEDED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS seeded (
+    stage TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    PRIMARY KEY (stage, user_id)
+)
+"""
+_USER_INDEX = "CREATE INDEX IF NOT EXISTS clips_user ON clips (stage, user_id)"
+
+
+class ClipIndex:
+    """
+    Persistent set of clip ids per pipeline stage
+
+    The summary, chat and video stages record each clip they have stored
+    (using the ledger's STAGE_* names), so "is this clip already here?" is
+    a set lookup instead of a CSV read or a directory listing. Data written
+    before the index existed is folded in once per user and stage by the
+    `seed` callback given to members().
+    """
+
+    def __init__(self, db_path: str = CLIP_INDEX_FILE, timeout: float = 30.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.db_path, timeout=self.timeout, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(_SCHEMA)
+            connection.execute(_SEEDED_SCHEMA)
+            connection.execute(_USER_INDEX)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def add(self, stage: str, user_id: str, clip_ids: Iterable[str]):
+        added_at = datetime.now().isoformat(timespec="seconds")
+        self._connection().executemany(
+            "INSERT OR IGNORE INTO clips (stage, clip_id, user_id, added_at) VALUES (?, ?, ?, ?)",
+            ((stage, str(clip_id), str(user_id), added_at) for clip_id in clip_ids),
+        )
+
+    def members(
+        self,
+        stage: str,
+        user_id: str,
+        seed: Optional[Callable[[], Iterable[str]]] = None,
+    ) -> set:
+        """
+        Clip ids recorded for a user at a stage
+
+        Args:
+            seed (callable, optional): returns the clip ids already stored
+                by earlier runs; called only the first time this user and
+                stage are looked up
+
+        Returns:
+            set: clip ids, for O(1) membership checks in a loop
+        """
+        connection = self._connection()
+        if seed is not None:
+            seeded = connection.execute(
+                "SELECT 1 FROM seeded WHERE stage = ? AND user_id = ?",
+                (stage, str(user_id)),
+            ).fetchone()
+            if seeded is None:
+                self.add(stage, user_id, seed())
+                connection.execute(
+                    "INSERT OR IGNORE INTO seeded (stage, user_id) VALUES (?, ?)",
+                    (stage, str(user_id)),
+                )
+        rows = connection.execute(
+            "SELECT clip_id FROM clips WHERE stage = ? AND user_id = ?",
+            (stage, str(user_id)),
+        )
+        return {clip_id for (clip_id,) in rows}
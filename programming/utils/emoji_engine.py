@@ -0,0 +1,100 @@
+import re
+from functools import lru_cache
+from typing import Iterable
+
+import demoji
+
+
+def load_emoji_codes() -> dict:
+    """Load demoji's emoji -> description table ({🔥: fire})"""
+    # demoji<2 loads its code table lazily, newer versions at import
+    demoji.set_emoji_pattern()
+    return dict(demoji._CODE_TO_DESC)
+
+
+def _trie_to_regex(trie: dict) -> str:
+    """Turn a character trie into a regex with one branch per next character
+
+    The end-of-code marker "" makes the continuation optional; greedy
+    matching then prefers the longest code, e.g. 👍🏽 over 👍.
+    """
+    branches = [
+        re.escape(char) + _trie_to_regex(child)
+        for char, child in sorted(trie.items())
+        if char
+    ]
+    if not branches:
+        return ""
+    if len(branches) == 1 and "" not in trie:
+        return branches[0]
+    body = f"(?:{'|'.join(branches)})"
+    return f"{body}?" if "" in trie else body
+
+
+def _first_char_class(trie: dict) -> str:
+    """Character class of every code's first character, as merged ranges
+
+    sre tests non-BMP class members one by one, so ~1.4k single emoji
+    characters are collapsed into ~150 contiguous ranges.
+    """
+    ranges = []
+    for codepoint in sorted(ord(char) for char in trie if char):
+        if ranges and codepoint == ranges[-1][1] + 1:
+            ranges[-1][1] = codepoint
+        else:
+            ranges.append([codepoint, codepoint])
+    members = [
+        re.escape(chr(start)) + (f"-{re.escape(chr(end))}" if end != start else "")
+        for start, end in ranges
+    ]
+    return f"[{''.join(members)}]"
+
+
+def compile_emoji_pattern(codes: Iterable[str]) -> re.Pattern:
+    trie = {}
+    for code in codes:
+        node = trie
+        for char in code:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    # The lookahead rejects plain text before entering the trie branches
+    return re.compile(f"(?={_first_char_class(trie)}){_trie_to_regex(trie)}")
+
+
+class EmojiEngine:
+    """Detect, count and describe emojis in a single scan per message"""
+
+    def __init__(self, codes: dict):
+        self.codes = codes
+        self.pattern = compile_emoji_pattern(codes)
+
+    def _describe(self, match: re.Match) -> str:
+        return self.codes[match.group()]
+
+    def translate(self, message: str) -> tuple[str, int]:
+        """Replace every emoji with its description
+
+        Returns:
+            tuple: (translated message, number of emojis found)
+        """
+        return self.pattern.subn(self._describe, message)
+
+    def translate_all(self, messages: Iterable[str]) -> tuple[list, list]:
+        """Translate many messages
+
+        Returns:
+            tuple: (translated messages, emoji counts), both in input order
+        """
+        translated = []
+        counts = []
+        for message in messages:
+            text, count = self.pattern.subn(self._describe, message)
+            translated.append(text)
+            counts.append(count)
+        return translated, counts
+
+
+@lru_cache(maxsize=1)
+def get_emoji_engine() -> EmojiEngine:
+    """Build the emoji engine once per process"""
+    return EmojiEngine(load_emoji_codes())
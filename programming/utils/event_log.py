@@ -0,0 +1,170 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import pandas as pd
+from datetime import datetime
+from multiprocessing.util import Finalize
+from typing import Optional
+
+EVENT_LOG_FILE = "data/events.jsonl"
+
+_FLUSH = object()
+_STOP = object()
+
+
+class EventLog:
+    """
+    Append-only JSON lines event sink
+
+    Any thread may call emit(); a single writer thread batches the events
+    and appends them to the file every flush_interval seconds, or sooner
+    once max_buffer events are waiting. Each process gets its own writer
+    thread, and every batch is appended with a single write call.
+    """
+
+    def __init__(
+        self,
+        file_path: str = EVENT_LOG_FILE,
+        flush_interval: float = 1.0,
+        max_buffer: int = 1000,
+    ):
+        self.file_path = file_path
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+
+    def _ensure_writer(self):
+        # A forked child inherits the object but not the writer thread
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(
+                target=self._run, name="event-log-writer", daemon=True
+            )
+            self._thread.start()
+            self._pid = os.getpid()
+            atexit.register(self.close)
+            Finalize(self, self.close, exitpriority=10)
+
+    def emit(self, event: str, **fields):
+        """Record one event, e.g. emit("download_mp4_fail", clip_id=...)"""
+        self._ensure_writer()
+        record = {
+            "datetime": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "event": event,
+            "pid": os.getpid(),
+            **fields,
+        }
+        self._queue.put(record)
+
+    def flush(self):
+        """Block until every event emitted so far is on disk"""
+        if self._pid != os.getpid():
+            return
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        done.wait()
+
+    def close(self):
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _write(self, lines: list):
+        if not lines:
+            return
+        directory = os.path.dirname(self.file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.file_path, "a", encoding="utf-8") as event_file:
+            event_file.write("".join(lines))
+        lines.clear()
+
+    def _run(self):
+        lines = []
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._write(lines)
+                continue
+            if item is _STOP:
+                self._write(lines)
+                return
+            if isinstance(item, tuple) and item[0] is _FLUSH:
+                self._write(lines)
+                item[1].set()
+                continue
+            lines.append(json.dumps(item, ensure_ascii=False, default=str) + "\n")
+            if len(lines) >= self.max_buffer:
+                self._write(lines)
+
+
+_event_log: Optional[EventLog] = None
+
+
+def get_event_log() -> EventLog:
+    """Process-wide event log writing to EVENT_LOG_FILE"""
+    global _event_log
+    if _event_log is None:
+        _event_log = EventLog(EVENT_LOG_FILE)
+    return _event_log
+
+
+def emit_event(event: str, **fields):
+    get_event_log().emit(event, **fields)
+
+
+def read_events(file_path: str = EVENT_LOG_FILE, event: Optional[str] = None):
+    """Yield events from the log, optionally only those of one type"""
+    if not os.path.exists(file_path):
+        return
+    with open(file_path, "r", encoding="utf-8") as event_file:
+        for line in event_file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if event is None or record.get("event") == event:
+                yield record
+
+
+def compact_events(
+    event: str,
+    columns: list,
+    output_file: str,
+    file_path: str = EVENT_LOG_FILE,
+    subset: Optional[list] = None,
+) -> pd.DataFrame:
+    """
+    Write a CSV view of one event type
+
+    Args:
+        event (str): event type to export
+        columns (list): CSV columns, taken from the event fields
+        output_file (str): CSV path
+        file_path (str, optional): event log to read
+        subset (list, optional): keep only the first event per these columns
+
+    Returns:
+        pd.DataFrame: the exported view
+    """
+    if file_path == EVENT_LOG_FILE:
+        get_event_log().flush()
+    rows = [
+        {column: record.get(column) for column in columns}
+        for record in read_events(file_path, event)
+    ]
+    view = pd.DataFrame(rows, columns=columns)
+    if subset:
+        view = view.drop_duplicates(subset=subset).reset_index(drop=True)
+    view.to_csv(output_file, index=False)
+    return view
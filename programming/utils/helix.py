@@ -0,0 +1,317 @@
+import asyncio
+import httpx
+import random
+import requests
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from typing import NamedTuple, Optional
+from utils.helix_cache import HelixCache, cache_key, response_ttl
+from utils.metrics import Metrics
+
+HELIX_BASE_URL = "https://api.twitch.tv/helix"
+HELIX_RATE_LIMIT = 800  # requests per minute for an app access token
+HELIX_MAX_IDS = 100  # max repeated id/login parameters per request
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """
+    Token bucket kept in sync with Helix's Ratelimit-* response headers
+
+    The bucket refills at limit/60 tokens per second. Callers reserve a
+    token and sleep outside the lock, so concurrent threads queue up
+    fairly instead of polling.
+    """
+
+    def __init__(self, limit: int = HELIX_RATE_LIMIT, period: float = 60.0):
+        self.period = period
+        self.capacity = float(limit)
+        self.rate = limit / period
+        self.tokens = float(limit)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, tokens: float = 1) -> float:
+        """Take tokens and return how long to wait before using them"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= tokens
+            return max(-self.tokens / self.rate, self.blocked_until - now, 0.0)
+
+    def acquire(self, tokens: float = 1):
+        """Block until a request (or `tokens` units, e.g. bytes) may be sent"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: float = 1):
+        """Wait, without blocking the event loop, until a request may be sent"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def update(self, headers):
+        """Adopt the server's view of the bucket from a response's headers"""
+        limit = headers.get("Ratelimit-Limit")
+        remaining = headers.get("Ratelimit-Remaining")
+        reset = headers.get("Ratelimit-Reset")
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if limit is not None:
+                self.capacity = float(limit)
+                self.rate = self.capacity / self.period
+            if remaining is not None:
+                # Requests still in flight are not counted by the server yet
+                self.tokens = min(self.tokens, float(remaining))
+                if int(remaining) <= 0 and reset is not None:
+                    self.blocked_until = now + max(0.0, float(reset) - time.time())
+
+
+def backoff_delay(backoff: float, attempt: int, response=None) -> float:
+    """Seconds to wait before retry `attempt`: until Ratelimit-Reset on a 429,
+    otherwise jittered exponential backoff"""
+    if response is not None and response.status_code == 429:
+        reset = response.headers.get("Ratelimit-Reset")
+        if reset is not None:
+            return max(0.0, float(reset) - time.time()) + random.uniform(0, 0.5)
+    return backoff * (2**attempt) * random.uniform(0.5, 1.5)
+
+
+class CachedGet(NamedTuple):
+    key: str
+    ttl: Optional[float]
+    entry: Optional[dict]
+
+    @property
+    def headers(self) -> Optional[dict]:
+        """Conditional request headers for a stale entry with an ETag"""
+        if self.entry and self.entry["etag"]:
+            return {"If-None-Match": self.entry["etag"]}
+        return None
+
+
+def request_stage(path: str) -> str:
+    """Metrics stage of an endpoint, e.g. /channels/followers -> helix_channels_followers"""
+    return "helix_" + path.strip("/").replace("/", "_")
+
+
+def record_request(
+    metrics: Optional[Metrics], path: str, seconds: float, response=None, error=None
+):
+    """Time one HTTP attempt and count it, failed ones by status or exception type"""
+    if metrics is None:
+        return
+    stage = request_stage(path)
+    metrics.observe(stage, seconds)
+    metrics.count(stage, "requests")
+    if error is not None:
+        metrics.error(stage, error)
+    elif response.status_code >= 400:
+        metrics.error(stage, f"HTTP {response.status_code}")
+
+
+def lookup_cached(cache: Optional[HelixCache], path: str, params) -> CachedGet:
+    """Find the cache entry, if any, for a GET on a cacheable endpoint"""
+    ttl = response_ttl(path, params)
+    if cache is None or ttl == 0:
+        return CachedGet(None, 0, None)
+    key = cache_key(path, params)
+    return CachedGet(key, ttl, cache.get(key))
+
+
+def store_cached(cache: Optional[HelixCache], cached: CachedGet, response) -> dict:
+    """Resolve a GET response against its cache lookup and return the body"""
+    if cached.entry and response.status_code == 304:
+        cache.refresh(cached.key, cached.ttl)
+        return cached.entry["body"]
+    response.raise_for_status()
+    body = response.json()
+    if cached.key is not None:
+        cache.put(cached.key, body, cached.ttl, etag=response.headers.get("ETag"))
+    return body
+
+
+class HelixClient:
+    """
+    Shared Twitch Helix client
+
+    One keep-alive session with a connection pool sized for the thread
+    pools using it, a shared RateLimiter, and retries with jittered
+    exponential backoff on 429, 5xx and connection errors. With a
+    HelixCache, get() serves fresh responses from disk and revalidates
+    stale ones by ETag.
+    """
+
+    def __init__(
+        self,
+        headers: dict,
+        base_url: str = HELIX_BASE_URL,
+        pool_size: int = 32,
+        max_retries: int = 5,
+        backoff: float = 0.5,
+        timeout: float = 10.0,
+        rate_limiter: Optional[RateLimiter] = None,
+        cache: Optional[HelixCache] = None,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.headers = headers
+        self.metrics = metrics
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.cache = cache
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _backoff_delay(self, attempt: int, response=None) -> float:
+        return backoff_delay(self.backoff, attempt, response)
+
+    def request(
+        self, method: str, path: str, params=None, headers: Optional[dict] = None
+    ) -> requests.Response:
+        """
+        Send a request, retrying throttled, failed and unreachable calls
+
+        Args:
+            path (str): endpoint under the Helix base URL, e.g. "/clips"
+            params (dict, optional): query parameters; list values are
+                repeated, e.g. {"login": ["a", "b"]} -> login=a&login=b
+
+        Returns:
+            requests.Response: the last response received
+        """
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = self.session.request(
+                    method, url, params=params, headers=headers, timeout=self.timeout
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                record_request(self.metrics, path, time.perf_counter() - start, error=e)
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._backoff_delay(attempt))
+                continue
+            record_request(self.metrics, path, time.perf_counter() - start, response)
+            self.rate_limiter.update(response.headers)
+            if (
+                response.status_code not in RETRY_STATUS_CODES
+                or attempt == self.max_retries
+            ):
+                return response
+            time.sleep(self._backoff_delay(attempt, response))
+        return response
+
+    def get(self, path: str, params=None) -> dict:
+        """GET a Helix endpoint and return its JSON body, cached if possible"""
+        cached = lookup_cached(self.cache, path, params)
+        if cached.entry and cached.entry["fresh"]:
+            if self.metrics is not None:
+                self.metrics.count(request_stage(path), "cache_hits")
+            return cached.entry["body"]
+        response = self.request("GET", path, params=params, headers=cached.headers)
+        return store_cached(self.cache, cached, response)
+
+
+class AsyncHelixClient:
+    """
+    asyncio counterpart of HelixClient for bulk lookups
+
+    Shares the RateLimiter and HelixCache of a HelixClient when given
+    them, so sync and async callers draw from the same quota and cache.
+    At most max_concurrency requests are in flight at once.
+    """
+
+    def __init__(
+        self,
+        headers: dict,
+        base_url: str = HELIX_BASE_URL,
+        max_concurrency: int = 50,
+        max_retries: int = 5,
+        backoff: float = 0.5,
+        timeout: float = 10.0,
+        rate_limiter: Optional[RateLimiter] = None,
+        cache: Optional[HelixCache] = None,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.metrics = metrics
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.cache = cache
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.client = httpx.AsyncClient(
+            headers=headers,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+            ),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.client.aclose()
+
+    async def request(
+        self, method: str, path: str, params=None, headers: Optional[dict] = None
+    ) -> httpx.Response:
+        """Send a request with the same retry policy as HelixClient.request"""
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self.rate_limiter.acquire_async()
+                start = time.perf_counter()
+                try:
+                    response = await self.client.request(
+                        method, url, params=params, headers=headers
+                    )
+                except httpx.TransportError as e:
+                    record_request(
+                        self.metrics, path, time.perf_counter() - start, error=e
+                    )
+                    if attempt == self.max_retries:
+                        raise
+                    await asyncio.sleep(backoff_delay(self.backoff, attempt))
+                    continue
+                record_request(
+                    self.metrics, path, time.perf_counter() - start, response
+                )
+                self.rate_limiter.update(response.headers)
+                if (
+                    response.status_code not in RETRY_STATUS_CODES
+                    or attempt == self.max_retries
+                ):
+                    return response
+                await asyncio.sleep(backoff_delay(self.backoff, attempt, response))
+        return response
+
+    async def get(self, path: str, params=None) -> dict:
+        """GET a Helix endpoint and return its JSON body, cached if possible"""
+        cached = lookup_cached(self.cache, path, params)
+        if cached.entry and cached.entry["fresh"]:
+            if self.metrics is not None:
+                self.metrics.count(request_stage(path), "cache_hits")
+            return cached.entry["body"]
+        response = await self.request(
+            "GET", path, params=params, headers=cached.headers
+        )
+        return store_cached(self.cache, cached, response)
@@ -0,0 +1,242 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+HELIX_CACHE_FILE = "data/helix_cache.sqlite3"
+HELIX_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Share of max_bytes left after an eviction, so the next puts don't evict again
+HELIX_CACHE_LOW_WATER = 0.9
+
+# Seconds a response stays fresh, per endpoint; endpoints not listed are not cached
+HELIX_CACHE_TTLS = {
+    "/users": 24 * 60 * 60,
+    "/channels/followers": 60 * 60,
+    "/clips": 15 * 60,
+}
+# A clip window that ended this long ago no longer gains clips
+CLOSED_WINDOW_DELAY = timedelta(days=1)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    body TEXT NOT NULL,
+    etag TEXT,
+    stored_at REAL NOT NULL,
+    expires_at REAL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL
+)
+"""
+_INDEX = "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+# Running total of responses.size, kept by triggers so put() never scans
+_TOTAL_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS total_size (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        size INTEGER NOT NULL
+    )
+    """,
+    """
+    INSERT OR IGNORE INTO total_size (id, size)
+    SELECT 0, COALESCE(SUM(size), 0) FROM responses
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS responses_insert AFTER INSERT ON responses
+    BEGIN UPDATE total_size SET size = size + NEW.size; END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS responses_delete AFTER DELETE ON responses
+    BEGIN UPDATE total_size SET size = size - OLD.size; END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS responses_update AFTER UPDATE OF size ON responses
+    BEGIN UPDATE total_size SET size = size + NEW.size - OLD.size; END
+    """,
+]
+
+
+def cache_key(path: str, params=None) -> str:
+    """Endpoint plus its params in a canonical order
+
+    Repeated params keep their values sorted, so {"login": ["b", "a"]}
+    and {"login": ["a", "b"]} share an entry.
+    """
+    normalized = []
+    for name, value in sorted((params or {}).items()):
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            value = sorted(str(item) for item in value)
+        else:
+            value = str(value)
+        normalized.append([name, value])
+    return f"/{path.lstrip('/')}?{json.dumps(normalized, separators=(',', ':'))}"
+
+
+def is_closed_window(params, delay: timedelta = CLOSED_WINDOW_DELAY) -> bool:
+    """True when params name an ended_at far enough in the past"""
+    ended_at = (params or {}).get("ended_at")
+    if not ended_at:
+        return False
+    ended_at = datetime.fromisoformat(str(ended_at).replace("Z", "+00:00"))
+    return ended_at <= datetime.now(timezone.utc) - delay
+
+
+def response_ttl(path: str, params=None) -> Optional[float]:
+    """
+    Freshness lifetime of a response
+
+    Returns:
+        float: seconds, 0 for uncached endpoints, or None for responses
+            that never expire (clip listings of closed windows)
+    """
+    path = f"/{path.lstrip('/')}"
+    if path not in HELIX_CACHE_TTLS:
+        return 0
+    if path == "/clips" and is_closed_window(params):
+        return None
+    return HELIX_CACHE_TTLS[path]
+
+
+class HelixCache:
+    """
+    SQLite cache of Helix JSON responses
+
+    Entries are keyed by cache_key(); stale entries keep their ETag so the
+    client can revalidate them with If-None-Match. The total body size is
+    bounded by max_bytes: once it is exceeded, the least recently used
+    entries are evicted down to low_water * max_bytes.
+    Connections are opened per thread, like JobLedger's.
+    """
+
+    def __init__(
+        self,
+        db_path: str = HELIX_CACHE_FILE,
+        max_bytes: int = HELIX_CACHE_MAX_BYTES,
+        low_water: float = HELIX_CACHE_LOW_WATER,
+        timeout: float = 30.0,
+    ):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.db_path, timeout=self.timeout, isolation_level=None
+            )
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            # INSERT OR REPLACE then fires the delete trigger for the old row
+            connection.execute("PRAGMA recursive_triggers=ON")
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(_SCHEMA)
+                connection.execute(_INDEX)
+                for statement in _TOTAL_SCHEMA:
+                    connection.execute(statement)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Look up an entry and mark it as recently used
+
+        Returns:
+            dict: {"body", "etag", "fresh"}, or None when not cached
+        """
+        now = time.time()
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT body, etag, expires_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        connection.execute(
+            "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+        )
+        return {
+            "body": json.loads(row["body"]),
+            "etag": row["etag"],
+            "fresh": row["expires_at"] is None or row["expires_at"] > now,
+        }
+
+    def put(self, key: str, body: dict, ttl: Optional[float], etag: str = None):
+        """Store a response; ttl None keeps it fresh forever"""
+        now = time.time()
+        text = json.dumps(body, ensure_ascii=False, separators=(",", ":"))
+        self._connection().execute(
+            """
+            INSERT OR REPLACE INTO responses
+                (key, endpoint, body, etag, stored_at, expires_at, accessed_at, size)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                key,
+                key.split("?", 1)[0],
+                text,
+                etag,
+                now,
+                None if ttl is None else now + ttl,
+                now,
+                len(text),
+            ),
+        )
+        self.evict()
+
+    def refresh(self, key: str, ttl: Optional[float]):
+        """Extend a stale entry after the server answered 304 Not Modified"""
+        now = time.time()
+        self._connection().execute(
+            "UPDATE responses SET expires_at = ?, accessed_at = ? WHERE key = ?",
+            (None if ttl is None else now + ttl, now, key),
+        )
+
+    def evict(self):
+        """Drop least recently used entries once the total is over max_bytes"""
+        connection = self._connection()
+        (total,) = connection.execute(
+            "SELECT size FROM total_size WHERE id = 0"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        connection.execute(
+            """
+            DELETE FROM responses WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(size) OVER (
+                        ORDER BY accessed_at DESC, key
+                    ) AS running_size
+                    FROM responses
+                )
+                WHERE running_size > ?
+            )
+            """,
+            (int(self.max_bytes * self.low_water),),
+        )
+
+    def clear(self, endpoint: Optional[str] = None):
+        if endpoint is None:
+            self._connection().execute("DELETE FROM responses")
+        else:
+            self._connection().execute(
+                "DELETE FROM responses WHERE endpoint = ?",
+                (f"/{endpoint.lstrip('/')}",),
+            )
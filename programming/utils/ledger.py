@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import pandas as pd
+from datetime import datetime
+from typing import Optional
+
+LEDGER_FILE = "data/ledger.sqlite3"
+
+# Pipeline stages recorded in the ledger
+STAGE_CLIPS = "clips"  # clip summary per user, clip_id is ""
+STAGE_CHATS = "chats"  # chat replay download per clip
+STAGE_CSV = "csv"  # chat enrichment per clip
+STAGE_MP4 = "mp4"  # video download per clip
+
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    stage TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    clip_id TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    input_checksum TEXT,
+    output_path TEXT,
+    error TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (stage, user_id, clip_id)
+)
+"""
+_WATERMARK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS watermarks (
+    stage TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    value TEXT NOT NULL,
+    ids TEXT NOT NULL DEFAULT '[]',
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (stage, user_id)
+)
+"""
+
+
+def file_checksum(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """blake2b digest of a file's content"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class JobLedger:
+    """
+    SQLite ledger of pipeline work keyed by (stage, user_id, clip_id)
+
+    Each stage asks should_run() before doing a unit of work and records
+    the outcome with start()/finish()/fail(). Connections are opened per
+    thread and per process, so the ledger can be shared by thread and
+    process pools.
+    """
+
+    def __init__(self, db_path: str = LEDGER_FILE, timeout: float = 30.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.db_path, timeout=self.timeout, isolation_level=None
+            )
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(_SCHEMA)
+            connection.execute(_WATERMARK_SCHEMA)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, stage: str, user_id: str, clip_id: str = "") -> Optional[dict]:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT * FROM jobs WHERE stage = ? AND user_id = ? AND clip_id = ?",
+                (stage, str(user_id), clip_id),
+            )
+            .fetchone()
+        )
+        return dict(row) if row else None
+
+    def should_run(
+        self,
+        stage: str,
+        user_id: str,
+        clip_id: str = "",
+        input_checksum: Optional[str] = None,
+    ) -> bool:
+        """
+        True unless the job is done for this input and its output still exists
+
+        Args:
+            input_checksum (str, optional): when given, a done job whose
+                recorded checksum differs is run again
+        """
+        job = self.get(stage, user_id, clip_id)
+        if job is None or job["status"] != STATUS_DONE:
+            return True
+        if input_checksum is not None and job["input_checksum"] != input_checksum:
+            return True
+        if job["output_path"] and not os.path.exists(job["output_path"]):
+            return True
+        return False
+
+    def start(
+        self,
+        stage: str,
+        user_id: str,
+        clip_id: str = "",
+        input_checksum: Optional[str] = None,
+    ):
+        self._connection().execute(
+            """
+            INSERT INTO jobs (stage, user_id, clip_id, status, attempts, input_checksum, updated_at)
+            VALUES (?, ?, ?, ?, 1, ?, ?)
+            ON CONFLICT (stage, user_id, clip_id) DO UPDATE SET
+                status = excluded.status,
+                attempts = jobs.attempts + 1,
+                input_checksum = excluded.input_checksum,
+                error = NULL,
+                updated_at = excluded.updated_at
+            """,
+            (
+                stage,
+                str(user_id),
+                clip_id,
+                STATUS_RUNNING,
+                input_checksum,
+                datetime.now().isoformat(timespec="seconds"),
+            ),
+        )
+
+    def _set_status(self, stage, user_id, clip_id, status, **fields):
+        self._connection().execute(
+            """
+            INSERT INTO jobs (stage, user_id, clip_id, status, input_checksum, output_path, error, updated_at)
+            VALUES (:stage, :user_id, :clip_id, :status, :input_checksum, :output_path, :error, :updated_at)
+            ON CONFLICT (stage, user_id, clip_id) DO UPDATE SET
+                status = excluded.status,
+                input_checksum = COALESCE(excluded.input_checksum, jobs.input_checksum),
+                output_path = COALESCE(excluded.output_path, jobs.output_path),
+                error = excluded.error,
+                updated_at = excluded.updated_at
+            """,
+            {
+                "stage": stage,
+                "user_id": str(user_id),
+                "clip_id": clip_id,
+                "status": status,
+                "input_checksum": fields.get("input_checksum"),
+                "output_path": fields.get("output_path"),
+                "error": fields.get("error"),
+                "updated_at": datetime.now().isoformat(timespec="seconds"),
+            },
+        )
+
+    def finish(
+        self,
+        stage: str,
+        user_id: str,
+        clip_id: str = "",
+        output_path: Optional[str] = None,
+        input_checksum: Optional[str] = None,
+    ):
+        self._set_status(
+            stage,
+            user_id,
+            clip_id,
+            STATUS_DONE,
+            output_path=output_path,
+            input_checksum=input_checksum,
+        )
+
+    def fail(self, stage: str, user_id: str, clip_id: str = "", error=None):
+        self._set_status(
+            stage,
+            user_id,
+            clip_id,
+            STATUS_FAILED,
+            error=None if error is None else str(error),
+        )
+
+    def failed_clip_ids(
+        self,
+        stage: str,
+        user_id: str,
+        error_prefix: str = "",
+        since: Optional[datetime] = None,
+    ) -> dict:
+        """
+        Clips whose last attempt failed, e.g. with a given kind of error
+
+        Args:
+            error_prefix (str, optional): only errors starting with this
+            since (datetime, optional): only failures recorded at or after it
+
+        Returns:
+            dict: clip_id -> error
+        """
+        query = (
+            "SELECT clip_id, error FROM jobs WHERE stage = ? AND user_id = ? "
+            "AND status = ? AND substr(error, 1, ?) = ?"
+        )
+        params = [stage, str(user_id), STATUS_FAILED, len(error_prefix), error_prefix]
+        if since is not None:
+            query += " AND updated_at >= ?"
+            params.append(since.isoformat(timespec="seconds"))
+        rows = self._connection().execute(query, params)
+        return {row["clip_id"]: row["error"] for row in rows}
+
+    def get_watermark(self, stage: str, user_id: str) -> Optional[tuple]:
+        """
+        High-water mark of an incremental stage
+
+        Returns:
+            tuple: (value, ids seen at exactly that value), or None
+        """
+        row = (
+            self._connection()
+            .execute(
+                "SELECT value, ids FROM watermarks WHERE stage = ? AND user_id = ?",
+                (stage, str(user_id)),
+            )
+            .fetchone()
+        )
+        return (row["value"], set(json.loads(row["ids"]))) if row else None
+
+    def set_watermark(self, stage: str, user_id: str, value: str, ids=()):
+        self._connection().execute(
+            """
+            INSERT OR REPLACE INTO watermarks (stage, user_id, value, ids, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (
+                stage,
+                str(user_id),
+                value,
+                json.dumps(sorted(ids)),
+                datetime.now().isoformat(timespec="seconds"),
+            ),
+        )
+
+    def completeness(self) -> pd.DataFrame:
+        """
+        Per-user job counts for every stage
+
+        Returns:
+            pd.DataFrame: one row per user with <stage>_done and
+                <stage>_failed columns
+        """
+        rows = self._connection().execute("""
+            SELECT
+                user_id,
+                SUM(stage = 'clips' AND status = 'done') AS clips_done,
+                SUM(stage = 'chats' AND status = 'done') AS chats_done,
+                SUM(stage = 'chats' AND status = 'failed') AS chats_failed,
+                SUM(stage = 'csv' AND status = 'done') AS csv_done,
+                SUM(stage = 'csv' AND status = 'failed') AS csv_failed,
+                SUM(stage = 'mp4' AND status = 'done') AS mp4_done,
+                SUM(stage = 'mp4' AND status = 'failed') AS mp4_failed
+            FROM jobs
+            GROUP BY user_id
+            ORDER BY user_id
+            """).fetchall()
+        return pd.DataFrame([dict(row) for row in rows])
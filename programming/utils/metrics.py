@@ -0,0 +1,343 @@
+import cProfile
+import json
+import math
+import os
+import pstats
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+
+try:
+    from prometheus_client import CollectorRegistry, write_to_textfile
+    from prometheus_client.core import CounterMetricFamily, HistogramMetricFamily
+except (
+    ImportError
+):  # Prometheus export is optional, the JSON summary needs nothing extra
+    CollectorRegistry = None
+
+METRICS_DIRECTORY = "data/metrics"
+PROFILE_DIRECTORY = f"{METRICS_DIRECTORY}/profiles"
+# Comma separated stages to run under cProfile, e.g. "re_message,download_chat"
+PROFILE_STAGES = [
+    stage for stage in os.environ.get("PIPELINE_PROFILE", "").split(",") if stage
+]
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+    math.inf,
+)
+
+
+class _Timing:
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self, bucket_count: int):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * bucket_count
+
+
+def _untimed_stage() -> dict:
+    return {"count": 0, "seconds": 0.0, "counters": {}, "errors": {}}
+
+
+class Metrics:
+    """
+    Per-stage timers, counters and latency histograms of a pipeline run
+
+    Any thread may record. A worker process sends its numbers back with
+    drain() and the parent folds them in with merge(); state inherited
+    through fork is dropped, so nothing is counted twice. Stages listed
+    in profile_stages also run under cProfile, and their cumulative
+    stats are written to '<profile_directory>/<stage>-<pid>.prof'.
+    """
+
+    def __init__(
+        self,
+        buckets: tuple = LATENCY_BUCKETS,
+        profile_stages: list = PROFILE_STAGES,
+        profile_directory: str = PROFILE_DIRECTORY,
+    ):
+        self.bucket_bounds = tuple(buckets)
+        self.profile_stages = set(profile_stages)
+        self.profile_directory = profile_directory
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._timings = {}
+        self._counters = Counter()  # (stage, name) -> value
+        self._errors = Counter()  # (stage, error type) -> count
+        self._profiles = {}  # stage -> pstats.Stats
+
+    def _own(self):
+        # Called with the lock held; a forked child starts from zero
+        if self._pid != os.getpid():
+            self._reset()
+
+    def observe(self, stage: str, seconds: float):
+        """Record one duration of a stage"""
+        with self._lock:
+            self._own()
+            timing = self._timings.get(stage)
+            if timing is None:
+                timing = self._timings[stage] = _Timing(len(self.bucket_bounds))
+            timing.count += 1
+            timing.total += seconds
+            timing.max = max(timing.max, seconds)
+            for i, bound in enumerate(self.bucket_bounds):
+                if seconds <= bound:
+                    timing.buckets[i] += 1
+                    break
+
+    def count(self, stage: str, name: str, value: float = 1):
+        """Add to a counter of a stage, e.g. count("export", "messages", 120)"""
+        with self._lock:
+            self._own()
+            self._counters[(stage, name)] += value
+
+    def error(self, stage: str, error):
+        """Count a failure of a stage by exception type, or by a given label"""
+        error_type = error if isinstance(error, str) else type(error).__name__
+        with self._lock:
+            self._own()
+            self._errors[(stage, error_type)] += 1
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Time a block as one run of `stage`; exceptions are counted and re-raised"""
+        profiler = self._start_profiler(stage)
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.error(stage, e)
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+            if profiler is not None:
+                self._stop_profiler(stage, profiler)
+
+    def _start_profiler(self, stage: str) -> Optional[cProfile.Profile]:
+        # One profiler per thread; a stage nested in a profiled one is
+        # already covered by the outer profile
+        if stage not in self.profile_stages or getattr(self._local, "profiling", False):
+            return None
+        self._local.profiling = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def _stop_profiler(self, stage: str, profiler: cProfile.Profile):
+        profiler.disable()
+        self._local.profiling = False
+        stats = pstats.Stats(profiler)
+        with self._lock:
+            self._own()
+            if stage in self._profiles:
+                self._profiles[stage].add(stats)
+            else:
+                self._profiles[stage] = stats
+
+    def dump_profiles(self) -> list:
+        """Write the cumulative profile of each stage; returns the file paths"""
+        with self._lock:
+            self._own()
+            profiles = dict(self._profiles)
+        if not profiles:
+            return []
+        os.makedirs(self.profile_directory, exist_ok=True)
+        file_paths = []
+        for stage, stats in profiles.items():
+            file_path = os.path.join(
+                self.profile_directory, f"{stage}-{os.getpid()}.prof"
+            )
+            stats.dump_stats(file_path)
+            file_paths.append(file_path)
+        return file_paths
+
+    def drain(self) -> dict:
+        """
+        Take the numbers recorded in this process since the last drain
+
+        Profiles stay in the process and are written to disk instead.
+
+        Returns:
+            dict: picklable snapshot for merge()
+        """
+        self.dump_profiles()
+        with self._lock:
+            self._own()
+            snapshot = {
+                "timings": {
+                    stage: (timing.count, timing.total, timing.max, timing.buckets)
+                    for stage, timing in self._timings.items()
+                },
+                "counters": dict(self._counters),
+                "errors": dict(self._errors),
+            }
+            self._timings = {}
+            self._counters = Counter()
+            self._errors = Counter()
+        return snapshot
+
+    def merge(self, snapshot: Optional[dict]):
+        """Add a snapshot from drain(), e.g. one sent back by a worker"""
+        if not snapshot:
+            return
+        with self._lock:
+            self._own()
+            for stage, (count, total, longest, buckets) in snapshot["timings"].items():
+                timing = self._timings.get(stage)
+                if timing is None:
+                    timing = self._timings[stage] = _Timing(len(self.bucket_bounds))
+                timing.count += count
+                timing.total += total
+                timing.max = max(timing.max, longest)
+                timing.buckets = [a + b for a, b in zip(timing.buckets, buckets)]
+            self._counters.update(snapshot["counters"])
+            self._errors.update(snapshot["errors"])
+
+    def _quantile(self, timing: _Timing, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile, capped at the max"""
+        rank = q * timing.count
+        seen = 0
+        for bound, count in zip(self.bucket_bounds, timing.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, timing.max)
+        return timing.max
+
+    def summary(self) -> dict:
+        """
+        Everything recorded so far, by stage
+
+        Returns:
+            dict: stage -> {"count", "seconds", "mean", "p50", "p95", "max",
+                "counters": {...}, "errors": {...}}, slowest stage first
+        """
+        with self._lock:
+            self._own()
+            timings = dict(self._timings)
+            counters = dict(self._counters)
+            errors = dict(self._errors)
+        stages = {}
+        for stage, timing in timings.items():
+            stages[stage] = {
+                "count": timing.count,
+                "seconds": round(timing.total, 4),
+                "mean": round(timing.total / timing.count, 4) if timing.count else 0.0,
+                "p50": round(self._quantile(timing, 0.5), 4),
+                "p95": round(self._quantile(timing, 0.95), 4),
+                "max": round(timing.max, 4),
+                "counters": {},
+                "errors": {},
+            }
+        for (stage, name), value in counters.items():
+            stages.setdefault(stage, _untimed_stage())["counters"][name] = value
+        for (stage, error_type), count in errors.items():
+            stages.setdefault(stage, _untimed_stage())["errors"][error_type] = count
+        return dict(
+            sorted(stages.items(), key=lambda item: item[1]["seconds"], reverse=True)
+        )
+
+    def write_json(self, file_path: str) -> dict:
+        summary = {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "stages": self.summary(),
+        }
+        with open(file_path, "w") as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+    def collect(self):
+        """prometheus_client collector interface, used by write_prometheus"""
+        with self._lock:
+            self._own()
+            timings = {
+                stage: (timing.total, list(timing.buckets))
+                for stage, timing in self._timings.items()
+            }
+            counters = dict(self._counters)
+            errors = dict(self._errors)
+
+        latency = HistogramMetricFamily(
+            "pipeline_stage_seconds", "Duration of each stage run", labels=["stage"]
+        )
+        for stage, (total, buckets) in timings.items():
+            cumulative = 0
+            bucket_values = []
+            for bound, count in zip(self.bucket_bounds, buckets):
+                cumulative += count
+                bucket_values.append(
+                    ("+Inf" if math.isinf(bound) else str(bound), cumulative)
+                )
+            latency.add_metric([stage], bucket_values, total)
+        yield latency
+
+        items = CounterMetricFamily(
+            "pipeline_items", "Items handled by each stage", labels=["stage", "item"]
+        )
+        for (stage, name), value in counters.items():
+            items.add_metric([stage, name], value)
+        yield items
+
+        failures = CounterMetricFamily(
+            "pipeline_errors", "Failures of each stage", labels=["stage", "error_type"]
+        )
+        for (stage, error_type), count in errors.items():
+            failures.add_metric([stage, error_type], count)
+        yield failures
+
+    def write_prometheus(self, file_path: str):
+        """Write the metrics in the Prometheus text format, e.g. for node_exporter"""
+        if CollectorRegistry is None:
+            raise ImportError("prometheus_client is required for Prometheus export")
+        registry = CollectorRegistry()
+        registry.register(self)
+        write_to_textfile(file_path, registry)
+
+    def export(self, directory: str = METRICS_DIRECTORY) -> dict:
+        """
+        Write the run's summary.json, metrics.prom and profiles
+
+        metrics.prom is skipped when prometheus_client is not installed.
+
+        Returns:
+            dict: the summary, slowest stage first
+        """
+        os.makedirs(directory, exist_ok=True)
+        summary = self.write_json(os.path.join(directory, "summary.json"))
+        if CollectorRegistry is not None:
+            self.write_prometheus(os.path.join(directory, "metrics.prom"))
+        self.dump_profiles()
+        return summary["stages"]
+
+
+_metrics: Optional[Metrics] = None
+
+
+def get_metrics() -> Metrics:
+    """Process-wide metrics of the pipeline"""
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
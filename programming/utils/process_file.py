@@ -1,9 +1,26 @@
+import gzip
 import json
 import os
 import pandas as pd
+from array import array
 from pandas.errors import EmptyDataError
+from utils.chat_schema import BadgeListInterner
 from utils.utils import write_log
 
+try:
+    import zstandard
+except ImportError:  # zstd storage is optional, gzip is always available
+    zstandard = None
+
+# Chat storage format -> file suffix
+CHAT_FILE_SUFFIXES = {
+    "json": ".json",
+    "ndjson.gz": ".ndjson.gz",
+    "ndjson.zst": ".ndjson.zst",
+}
+PARTIAL_FILE_SUFFIX = ".part"
+
+
 def create_json_file(data, output):
     with open(output, "w") as json_file:
         json.dump(data, json_file, indent=4)
@@ -40,6 +57,185 @@ def read_json_file(file_path) -> pd.DataFrame:
     return df
 
 
+def iter_json_array(file_path, chunk_size=1 << 16):
+    """
+    Yield the items of a top-level JSON array one at a time
+
+    Only the current chunk and the item being decoded are held in memory,
+    so peak memory does not grow with the size of the file.
+
+    Args:
+        file_path (str): JSON file holding an array
+        chunk_size (int, optional): characters read per chunk
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, "r", encoding="utf-8") as json_file:
+        buffer = ""
+        position = 0
+        eof = False
+        expect = "["
+        while True:
+            # Skip whitespace and separators, refilling the buffer as needed
+            while True:
+                while position < len(buffer) and buffer[position] in " \t\r\n,":
+                    position += 1
+                if position < len(buffer) or eof:
+                    break
+                buffer = json_file.read(chunk_size)
+                position = 0
+                eof = not buffer
+            if position >= len(buffer):
+                if expect == "[":
+                    return
+                raise ValueError(f"{file_path}: unexpected end of JSON array")
+            if expect == "[":
+                if buffer[position] != "[":
+                    raise ValueError(f"{file_path}: expected a JSON array")
+                position += 1
+                expect = "item"
+                continue
+            if buffer[position] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+                # A value ending exactly at the buffer edge may be cut short
+                if end == len(buffer) and not eof:
+                    raise json.JSONDecodeError("truncated", buffer, end)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = json_file.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield item
+            position = end
+
+
+def is_chat_file(file_name: str) -> bool:
+    """True for finished chat files, in any storage format"""
+    return file_name.endswith(tuple(CHAT_FILE_SUFFIXES.values()))
+
+
+def get_chat_file_id(file_name: str) -> str:
+    """Clip id of a chat file, e.g. 'data/comments/1/Clip-abc.ndjson.gz' -> 'Clip-abc'"""
+    base_name = os.path.basename(file_name)
+    for suffix in CHAT_FILE_SUFFIXES.values():
+        if base_name.endswith(suffix):
+            return base_name[: -len(suffix)]
+    return os.path.splitext(base_name)[0]
+
+
+def open_ndjson(file_path, mode="rt", compression=None):
+    """
+    Open a (compressed) NDJSON file as text
+
+    Args:
+        compression (str, optional): "gz", "zst" or None for plain text;
+            inferred from the file suffix when not given
+    """
+    if compression is None:
+        compression = file_path.rsplit(".", 1)[-1]
+    if compression == "zst":
+        if zstandard is None:
+            raise ImportError("zstandard is required for .ndjson.zst chat files")
+        return zstandard.open(file_path, mode, encoding="utf-8")
+    if compression == "gz":
+        return gzip.open(file_path, mode, encoding="utf-8")
+    return open(file_path, mode, encoding="utf-8")
+
+
+def iter_ndjson(file_path):
+    """Yield one item per non-empty line of an NDJSON file"""
+    with open_ndjson(file_path) as ndjson_file:
+        for line in ndjson_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_chat_items(file_path):
+    """Yield chat items from a chat file in any storage format"""
+    if file_path.endswith(".json"):
+        return iter_json_array(file_path)
+    return iter_ndjson(file_path)
+
+
+def write_chat_file(chats, output_path: str, storage_format="ndjson.gz") -> str:
+    """
+    Write chat items as they are produced, then publish the file atomically
+
+    Items go to '<output_path>.part' first and are renamed into place only
+    when the iterator is exhausted, so an interrupted download never looks
+    like a finished chat file.
+
+    Args:
+        chats (iterable): chat items, e.g. the ChatDownloader generator
+        output_path (str): final path, including the storage format suffix
+        storage_format (str, optional): one of CHAT_FILE_SUFFIXES
+
+    Returns:
+        str: output_path
+    """
+    partial_path = f"{output_path}{PARTIAL_FILE_SUFFIX}"
+    try:
+        if storage_format == "json":
+            with open(partial_path, "w", encoding="utf-8") as f:
+                json.dump(list(chats), f, ensure_ascii=False, indent=4)
+        else:
+            compression = storage_format.rsplit(".", 1)[-1]
+            with open_ndjson(partial_path, "wt", compression) as f:
+                for chat in chats:
+                    f.write(json.dumps(chat, ensure_ascii=False, separators=(",", ":")))
+                    f.write("\n")
+        os.replace(partial_path, output_path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    return output_path
+
+
+def read_chat_replay(file_path) -> dict:
+    """
+    Stream a chat replay file into column buffers
+
+    Only the fields used downstream are kept from each chat item:
+    author.id, author.badges[].title, message, message_id, time_text
+    and time_in_seconds. Messages with the same badges share one list.
+
+    Returns:
+        dict: column name -> list (time_in_seconds is a float64 array)
+    """
+    columns = {
+        "author_id": [],
+        "badges_list": [],
+        "raw_message": [],
+        "message_id": [],
+        "time_text": [],
+        "time_in_seconds": array("d"),
+    }
+    intern_badges = BadgeListInterner()
+    for chat in iter_chat_items(file_path):
+        author = chat.get("author") or {}
+        columns["author_id"].append(author.get("id"))
+        columns["badges_list"].append(
+            intern_badges(
+                [
+                    badge.get("title") if badge.get("title") else []
+                    for badge in author.get("badges", [])
+                ]
+            )
+        )
+        columns["raw_message"].append(chat.get("message"))
+        columns["message_id"].append(chat.get("message_id"))
+        columns["time_text"].append(chat.get("time_text"))
+        time_in_seconds = chat.get("time_in_seconds")
+        columns["time_in_seconds"].append(
+            float("nan") if time_in_seconds is None else time_in_seconds
+        )
+    return columns
+
+
 # Get the list of valid files
 def get_files_with_digit_names(directory):
     chat_directory_items = os.listdir(directory)
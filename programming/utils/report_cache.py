@@ -0,0 +1,105 @@
+import os
+import pickle
+import sqlite3
+import threading
+from typing import Any, Optional
+
+REPORT_CACHE_FILE = "data/report_cache.sqlite3"
+# Bump when a partial's layout or meaning changes, to drop old entries
+REPORT_CACHE_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS partials (
+    kind TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    partial BLOB NOT NULL,
+    PRIMARY KEY (kind, file_path)
+)
+"""
+
+
+def file_fingerprint(file_path: str) -> tuple:
+    """(size, mtime_ns) of a file; changes whenever the file is rewritten"""
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class ReportCache:
+    """
+    SQLite cache of per-file report partials
+
+    Each entry holds the partial aggregate of one input file along with
+    the file's size and mtime, so a report only re-aggregates files that
+    changed and merges the cached partials of the rest.
+    """
+
+    def __init__(self, db_path: str = REPORT_CACHE_FILE, timeout: float = 30.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.db_path, timeout=self.timeout, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(_SCHEMA)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, kind: str, file_path: str, fingerprint: tuple) -> Optional[Any]:
+        """The cached partial of a file, or None if missing or out of date"""
+        row = (
+            self._connection()
+            .execute(
+                """
+                SELECT partial FROM partials
+                WHERE kind = ? AND file_path = ? AND size = ? AND mtime_ns = ?
+                    AND version = ?
+                """,
+                (kind, file_path, *fingerprint, REPORT_CACHE_VERSION),
+            )
+            .fetchone()
+        )
+        return pickle.loads(row[0]) if row else None
+
+    def put(self, kind: str, file_path: str, fingerprint: tuple, partial: Any):
+        self._connection().execute(
+            """
+            INSERT OR REPLACE INTO partials
+                (kind, file_path, size, mtime_ns, version, partial)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (
+                kind,
+                file_path,
+                *fingerprint,
+                REPORT_CACHE_VERSION,
+                pickle.dumps(partial, protocol=pickle.HIGHEST_PROTOCOL),
+            ),
+        )
+
+    def prune(self, kind: str, file_paths: list):
+        """Forget files of this kind that are no longer report inputs"""
+        connection = self._connection()
+        connection.execute("CREATE TEMP TABLE IF NOT EXISTS keep (file_path TEXT)")
+        connection.execute("DELETE FROM keep")
+        connection.executemany(
+            "INSERT INTO keep VALUES (?)", ((path,) for path in file_paths)
+        )
+        connection.execute(
+            """
+            DELETE FROM partials
+            WHERE kind = ? AND file_path NOT IN (SELECT file_path FROM keep)
+            """,
+            (kind,),
+        )
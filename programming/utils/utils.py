@@ -1,10 +1,12 @@
 import pandas as pd
 import os
 import re
+import sys
 import traceback
 import whisper
 from datetime import datetime
 from typing import Optional
+from utils.event_log import emit_event
 
 
 def remove_punctuation_from_directory(name: str):
@@ -30,6 +32,12 @@ def make_url(url, repeated_param: str, parameters: list):
     return url
 
 
+def chunked(items, size: int):
+    """Split items into lists of at most `size`, e.g. Helix's 100-login limit"""
+    items = list(items)
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
 def custom_sort(dict_list, sort_order):
     # Create a mapping of display_name to index in the sort_order list
     order_dict = {name: index for index, name in enumerate(sort_order)}
@@ -53,17 +61,42 @@ def concat_df_to_file(df_list: list, output_file: str, subset=None):
     return concated_df
 
 
+def append_df_to_file(df: pd.DataFrame, output_file: str):
+    """
+    Append rows to a CSV without reading its existing rows
+
+    New rows follow the column order of the file's header; a missing or
+    empty file is written with a header.
+    """
+    try:
+        header = pd.read_csv(output_file, nrows=0).columns
+    except (FileNotFoundError, pd.errors.EmptyDataError):
+        df.to_csv(output_file, index=False)
+    else:
+        df.reindex(columns=header).to_csv(
+            output_file, mode="a", header=False, index=False
+        )
+    return df
+
+
 def write_log(file, exception_message):
     with open(file, "a") as log_file:
         # Write some content to the file
         log_file.write(f"{datetime.now()}: {exception_message}\n")
         traceback.print_exc(file=log_file)
         log_file.write("\n")
+    emit_event(
+        "log",
+        log_file=file,
+        message=str(exception_message),
+        traceback=traceback.format_exc() if sys.exc_info()[0] else None,
+    )
+
 
 def get_items_in_dir(dir: str):
     items = []
     for item in os.listdir(dir):
-        subdir = f'{dir}/{item}'
+        subdir = f"{dir}/{item}"
         if os.path.isdir(subdir):
             if os.listdir(subdir):
                 items.append(str(item))